@@ -26,35 +26,50 @@ TITLE = "Boing!"
 HALF_WIDTH = WIDTH // 2
 HALF_HEIGHT = HEIGHT // 2
 
+# Multiplying by this is the same as dividing by HALF_WIDTH, but a little quicker - see Bat.ai
+INVERSE_HALF_WIDTH = 1.0 / HALF_WIDTH
+
 PLAYER_SPEED = 6
 MAX_AI_SPEED = 6
 
-def normalised(x, y):
+# Positions the ball must cross on the X axis before it can bounce off a bat (344 pixels either side of the centre
+# of the screen - see Ball.update), and on the Y axis before it bounces off the top or bottom of the arena (220
+# pixels either side of the centre)
+BAT_THRESHOLD_LEFT = HALF_WIDTH - 344
+BAT_THRESHOLD_RIGHT = HALF_WIDTH + 344
+ARENA_TOP = HALF_HEIGHT - 220
+ARENA_BOTTOM = HALF_HEIGHT + 220
+
+# The impact sprites are 75 pixels square. Impacts are drawn centred on the position where the ball bounced, so we
+# subtract this from that position to get the top-left corner - see Game.add_impact
+IMPACT_HALF_SIZE = 37.5
+
+# Names of sprites which are chosen based on a number, such as the frame of an animation or a digit of a score. Rather
+# than joining strings together to make names such as "impact3" every frame, we build all the names once here, and
+# then just look up the one we need. For example, BAT_IMAGES[1][2] is "bat12" and DIGIT_IMAGES[0][5] is "digit05".
+IMPACT_IMAGES = tuple(f"impact{i}" for i in range(5))
+BAT_IMAGES = tuple(tuple(f"bat{player}{frame}" for frame in range(3)) for player in range(2))
+DIGIT_IMAGES = tuple(tuple(f"digit{colour}{digit}" for digit in range(10)) for colour in range(3))
+EFFECT_IMAGES = ("effect0", "effect1")
+MENU_IMAGES = ("menu0", "menu1")
+
+def normalised(x, y, hypot=math.hypot):
     # Return a unit vector
+    # If the vector lies along one of the axes, the answer is simply 1 or -1 on that axis, so we don't need to do
+    # any further maths
+    if y == 0:
+        return (1.0 if x >= 0 else -1.0, 0.0)
+    if x == 0:
+        return (0.0, 1.0 if y >= 0 else -1.0)
+
     # Get length of vector (x,y) - math.hypot uses Pythagoras' theorem to get length of hypotenuse
-    # of right-angle triangle with sides of length x and y
+    # of right-angle triangle with sides of length x and y. It's passed in as a default parameter so that we don't
+    # have to look it up in the math module each time.
     # todo note on safety
-    length = math.hypot(x, y)
-    return (x / length, y / length)
-
-def sign(x):
-    # Returns -1 or 1 depending on whether number is positive or negative
-    return -1 if x < 0 else 1
-
-
-# Class for an animation which is displayed briefly whenever the ball bounces
-class Impact(Actor):
-    def __init__(self, pos):
-        super().__init__("blank", pos)
-        self.time = 0
-
-    def update(self):
-        # There are 5 impact sprites numbered 0 to 4. We update to a new sprite every 2 frames.
-        self.image = "impact" + str(self.time // 2)
-
-        # The Game class maintains a list of Impact instances. In Game.update, if the timer for an object
-        # has gone beyond 10, the object is removed from the list.
-        self.time += 1
+    # We divide once to get the reciprocal of the length, then multiply both components by it - multiplying is
+    # quicker than dividing
+    inverse_length = 1.0 / hypot(x, y)
+    return (x * inverse_length, y * inverse_length)
 
 
 class Ball(Actor):
@@ -72,15 +87,43 @@ class Ball(Actor):
 
         self.speed = 5
 
-    def update(self):
+    # The extra parameters with default values are never passed in by callers. They give the method its own local
+    # names for some global functions and constants. Python looks up local names faster than global ones, which
+    # makes a difference in the loop below, as it can run many times per frame.
+    def update(self, abs=abs, min=min, normalised=normalised, HALF_WIDTH=HALF_WIDTH, HALF_HEIGHT=HALF_HEIGHT,
+               BAT_THRESHOLD_LEFT=BAT_THRESHOLD_LEFT, BAT_THRESHOLD_RIGHT=BAT_THRESHOLD_RIGHT,
+               ARENA_TOP=ARENA_TOP, ARENA_BOTTOM=ARENA_BOTTOM):
         # Each frame, we move the ball in a series of small steps - the number of steps being based on its speed attribute
-        for i in range(self.speed):
+        steps = self.speed
+
+        # Copy the ball's position and direction into local variables, and only store them back in the object's
+        # attributes once we've finished moving. Python can read and change local variables more quickly than
+        # attributes of an object, and the code below uses them many times per frame.
+        x, y = self.x, self.y
+        dx, dy = self.dx, self.dy
+
+        # Most of the time the ball is nowhere near a bat or a wall, so none of those small steps can result in a
+        # bounce. We work out how many steps we can take before the ball could possibly reach the bat threshold on the
+        # X axis (344 pixels from the centre - see below) or the top or bottom of the arena (220 pixels from the
+        # centre), and take all of those steps in one go. We subtract one from each count to leave a safety margin, so
+        # that the step on which a bounce occurs is always dealt with by the loop below.
+        safe_steps = min(steps, int((344 - abs(x - HALF_WIDTH)) / abs(dx)) - 1)
+        if dy != 0:
+            safe_steps = min(safe_steps, int((220 - abs(y - HALF_HEIGHT)) / abs(dy)) - 1)
+
+        if safe_steps > 0:
+            x += dx * safe_steps
+            y += dy * safe_steps
+            steps -= safe_steps
+
+        # Take the remaining steps one at a time, checking for bounces after each one
+        for i in range(steps):
             # Store the previous x position
-            original_x = self.x
+            original_x = x
 
             # Move the ball based on dx and dy
-            self.x += self.dx
-            self.y += self.dy
+            x += dx
+            y += dy
 
             # Check to see if ball needs to bounce off a bat
 
@@ -91,22 +134,23 @@ class Ball(Actor):
             # sprites are anchored from their centres, when determining if they overlap or touch, we need to look at
             # their half-widths - 9 and 7. Therefore, if the centre of the ball is 344 pixels from the centre of the
             # screen, it can bounce off a bat (assuming the bat is in the right position on the Y axis - checked
-            # shortly afterwards).
+            # shortly afterwards). BAT_THRESHOLD_LEFT and BAT_THRESHOLD_RIGHT are the X positions 344 pixels either
+            # side of the centre, so comparing against them directly saves us from having to work out the distance.
             # We also check the previous X position to ensure that this is the first frame in which the ball crossed the threshold.
-            if abs(self.x - HALF_WIDTH) >= 344 and abs(original_x - HALF_WIDTH) < 344:
+            if (x <= BAT_THRESHOLD_LEFT or x >= BAT_THRESHOLD_RIGHT) and BAT_THRESHOLD_LEFT < original_x < BAT_THRESHOLD_RIGHT:
 
                 # Now that we know the edge of the ball has crossed the threshold on the x-axis, we need to check to
                 # see if the bat on the relevant side of the arena is at a suitable position on the y-axis for the
                 # ball collide with it.
 
-                if self.x < HALF_WIDTH:
+                if x < HALF_WIDTH:
                     new_dir_x = 1
                     bat = game.bats[0]
                 else:
                     new_dir_x = -1
                     bat = game.bats[1]
 
-                difference_y = self.y - bat.y
+                difference_y = y - bat.y
 
                 if difference_y > -64 and difference_y < 64:
                     # Ball has collided with bat - calculate new direction vector
@@ -127,21 +171,24 @@ class Ball(Actor):
                     # bat. This gives the player a bit of control over where the ball goes.
 
                     # Bounce the opposite way on the X axis
-                    self.dx = -self.dx
+                    dx = -dx
 
                     # Deflect slightly up or down depending on where ball hit bat
-                    self.dy += difference_y / 128
+                    dy += difference_y / 128
 
                     # Limit the Y component of the vector so we don't get into a situation where the ball is bouncing
                     # up and down too rapidly
-                    self.dy = min(max(self.dy, -1), 1)
+                    if dy > 1:
+                        dy = 1
+                    elif dy < -1:
+                        dy = -1
 
                     # Ensure our direction vector is a unit vector, i.e. represents a distance of the equivalent of
                     # 1 pixel regardless of its angle
-                    self.dx, self.dy = normalised(self.dx, self.dy)
+                    dx, dy = normalised(dx, dy)
 
                     # Create an impact effect
-                    game.impacts.append(Impact((self.x - new_dir_x * 10, self.y)))
+                    game.add_impact(x - new_dir_x * 10, y)
 
                     # Increase speed with each hit
                     self.speed += 1
@@ -165,19 +212,23 @@ class Ball(Actor):
                         game.play_sound("hit_veryfast", 1)
 
             # The top and bottom of the arena are 220 pixels from the centre
-            if abs(self.y - HALF_HEIGHT) > 220:
+            if y < ARENA_TOP or y > ARENA_BOTTOM:
                 # Invert vertical direction and apply new dy to y so that the ball is no longer overlapping with the
                 # edge of the arena
-                self.dy = -self.dy
-                self.y += self.dy
+                dy = -dy
+                y += dy
 
                 # Create impact effect
-                game.impacts.append(Impact(self.pos))
+                game.add_impact(x, y)
 
                 # Sound effect
                 game.play_sound("bounce", 5)
                 game.play_sound("bounce_synth", 1)
 
+        # Store the ball's new position and direction
+        self.x, self.y = x, y
+        self.dx, self.dy = dx, dy
+
     def out(self):
         # Has ball gone off the left or right edge of the screen?
         return self.x < 0 or self.x > WIDTH
@@ -192,6 +243,10 @@ class Bat(Actor):
         self.player = player
         self.score = 0
 
+        # The two digits of the score, which are used to choose which digit sprites to display in Game.draw. We only
+        # need to work these out when the score changes, rather than every time the score is drawn
+        self.score_digits = (0, 0)
+
         # move_func is a function we may or may not have been passed by the code which created this object. If this bat
         # is meant to be player controlled, move_func will be a function that when called, returns a number indicating
         # the direction and speed in which the bat should move, based on the keys the player is currently pressing.
@@ -214,7 +269,12 @@ class Bat(Actor):
         y_movement = self.move_func()
 
         # Apply y_movement to y position, ensuring bat does not go through the side walls
-        self.y = min(400, max(80, self.y + y_movement))
+        y = self.y + y_movement
+        if y > 400:
+            y = 400
+        elif y < 80:
+            y = 80
+        self.y = y
 
         # Choose the appropriate sprite. There are 3 sprites per player - e.g. bat00 is the left-hand player's
         # standard bat sprite, bat01 is the sprite to use when the ball has just bounced off the bat, and bat02
@@ -228,7 +288,7 @@ class Bat(Actor):
             else:
                 frame = 1
 
-        self.image = "bat" + str(self.player) + str(frame)
+        self.image = BAT_IMAGES[self.player][frame]
 
     def ai(self):
         # Returns a number indicating how the computer player will move - e.g. 4 means it will move 4 pixels down
@@ -254,14 +314,21 @@ class Bat(Actor):
         # ball is at the same position as us on the X axis, our target will be target_y_2. If it's 200 pixels away,
         # we'll aim for halfway between target_y_1 and target_y_2. This reflects the idea that as the ball gets closer,
         # we have a better idea of where it's going to end up.
-        weight1 = min(1, x_distance / HALF_WIDTH)
+        weight1 = x_distance * INVERSE_HALF_WIDTH
+        if weight1 > 1:
+            weight1 = 1
         weight2 = 1 - weight1
 
         target_y = (weight1 * target_y_1) + (weight2 * target_y_2)
 
         # Subtract target_y from our current Y position, then make sure we can't move any further than MAX_AI_SPEED
         # each frame
-        return min(MAX_AI_SPEED, max(-MAX_AI_SPEED, target_y - self.y))
+        delta_y = target_y - self.y
+        if delta_y > MAX_AI_SPEED:
+            return MAX_AI_SPEED
+        if delta_y < -MAX_AI_SPEED:
+            return -MAX_AI_SPEED
+        return delta_y
 
 
 class Game:
@@ -273,26 +340,48 @@ class Game:
         # Create a ball object
         self.ball = Ball(-1)
 
-        # Create an empty list which will later store the details of currently playing impact
-        # animations - these are displayed for a short time every time the ball bounces
-        self.impacts = []
+        # Create two empty lists which will later store the details of currently playing impact animations - these
+        # are displayed for a short time every time the ball bounces. Rather than creating an Actor for each one, we
+        # just keep track of where each impact should be drawn, and the frame on which it was created. We don't
+        # need to count up a separate timer for each impact - to find out how long one has been on screen, we
+        # subtract its start frame from the current frame number.
+        # The two lists are kept in step with each other, so impact_positions[0] and impact_start_frames[0] are both
+        # details of the same impact.
+        self.impact_positions = []
+        self.impact_start_frames = []
+
+        # Counts up by one each time update is called
+        self.frame = 0
 
         # Add an offset to the AI player's target Y position, so it won't aim to hit the ball exactly
         # in the centre of the bat
         self.ai_offset = 0
 
+        # Dictionary of sounds which have been loaded so far - see play_sound
+        self.sound_cache = {}
+
     def update(self):
-        # Update all active objects
-        for obj in self.bats + [self.ball] + self.impacts:
+        # Move on to the next frame. We do this before updating the ball, so that any new impacts created by the
+        # ball this frame will be drawn starting from their first animation frame.
+        self.frame += 1
+
+        # Remove any expired impact effects. There are 5 impact sprites, and we move on to a new one every 2 frames,
+        # so an impact has finished once it has been on screen for 9 frames. New impacts are always added to the end
+        # of the lists, so the oldest ones - which are the ones that finish first - are at the start. This means we
+        # only need to count how many finished impacts there are at the start of the list, and then remove them all
+        # at once. Most of the time there are no impacts at all, in which case the while loop stops straight away.
+        expired = 0
+        while expired < len(self.impact_start_frames) and self.frame - self.impact_start_frames[expired] >= 9:
+            expired += 1
+        if expired > 0:
+            del self.impact_positions[:expired]
+            del self.impact_start_frames[:expired]
+
+        # Update all active objects. We loop over the bats separately rather than joining them with the ball into
+        # one list, as that would create a brand new list every frame only to throw it away again
+        for obj in self.bats:
             obj.update()
-
-        # Remove any expired impact effects from the list. We go through the list backwards, starting from the last
-        # element, and delete any elements those time attribute has reached 10. We go backwards through the list
-        # instead of forwards to avoid a number of issues which occur in that scenario. In the next chapter we will
-        # look at an alternative technique for removing items from a list, using list comprehensions.
-        for i in range(len(self.impacts) - 1, -1, -1):
-            if self.impacts[i].time >= 10:
-                del self.impacts[i]
+        self.ball.update()
 
         # Has ball gone off the left or right edge of the screen?
         if self.ball.out():
@@ -307,7 +396,13 @@ class Game:
             # We set it to 20, which means that this player's bat will display a different animation frame for 20
             # frames, and a new ball will be created after 20 frames
             if self.bats[losing_player].timer < 0:
-                self.bats[scoring_player].score += 1
+                scoring_bat = self.bats[scoring_player]
+                scoring_bat.score += 1
+                # Convert score into a string of 2 digits (e.g. "05"), then turn the first two characters back into
+                # numbers. The attract mode game on the menu never ends, so its scores can go beyond 99 - in that case
+                # we only show the first two digits
+                score = f"{scoring_bat.score:02d}"
+                scoring_bat.score_digits = (int(score[0]), int(score[1]))
 
                 game.play_sound("score_goal", 1)
 
@@ -322,34 +417,48 @@ class Game:
         # Draw background
         screen.blit("table", (0,0))
 
+        # Check once whether the ball is out of play, as we need to know this for several things below
+        ball_out = self.ball.out()
+
         # Draw 'just scored' effects, if required
         for p in (0,1):
-            if self.bats[p].timer > 0 and game.ball.out():
-                screen.blit("effect" + str(p), (0,0))
+            if self.bats[p].timer > 0 and ball_out:
+                screen.blit(EFFECT_IMAGES[p], (0,0))
 
-        # Draw bats, ball and impact effects - in that order. Square brackets are needed around the ball because
-        # it's just an object, whereas the other two are lists - and you can't directly join an object onto a
-        # list without first putting it in a list
-        for obj in self.bats + [self.ball] + self.impacts:
+        # Draw bats, ball and impact effects - in that order. As in update, we go through the bats list directly
+        # instead of joining it together with the ball into a new list each frame
+        for obj in self.bats:
             obj.draw()
+        self.ball.draw()
+
+        # zip lets us go through the two impact lists together. Each impact moves on to a new sprite every 2 frames.
+        for pos, start_frame in zip(self.impact_positions, self.impact_start_frames):
+            screen.blit(IMPACT_IMAGES[(self.frame - start_frame) // 2], pos)
 
         # Display scores - outer loop goes through each player
         for p in (0,1):
-            # Convert score into a string of 2 digits (e.g. "05") so we can later get the individual digits
-            score = f"{self.bats[p].score:02d}"
+            # Get the individual digits of the score
+            score_digits = self.bats[p].score_digits
             # Inner loop goes through each digit
             for i in (0,1):
                 # Digit sprites are numbered 00 to 29, where the first digit is the colour (0 = grey,
                 # 1 = blue, 2 = green) and the second digit is the digit itself
                 # Colour is usually grey but turns red or green (depending on player number) when a
                 # point has just been scored
-                colour = "0"
+                colour = 0
                 other_p = 1 - p
-                if self.bats[other_p].timer > 0 and game.ball.out():
-                    colour = "2" if p == 0  else "1"
-                image = "digit" + colour + str(score[i])
+                if self.bats[other_p].timer > 0 and ball_out:
+                    colour = 2 if p == 0 else 1
+                image = DIGIT_IMAGES[colour][score_digits[i]]
                 screen.blit(image, (255 + (160 * p) + (i * 55), 46))
 
+    def add_impact(self, x, y):
+        # Start a new impact animation centred on the given position
+        # The position is rounded down after subtracting IMPACT_HALF_SIZE, which is what happens when an Actor
+        # centred on the same position is drawn
+        self.impact_positions.append((int(x - IMPACT_HALF_SIZE), int(y - IMPACT_HALF_SIZE)))
+        self.impact_start_frames.append(self.frame)
+
     def play_sound(self, name, count=1, menu_sound=False):
         # Some sounds have multiple varieties. If count > 1, we'll randomly choose one from those
         # We don't play any in-game sound effects if player 0 is an AI player - as this means we're on the menu
@@ -362,26 +471,43 @@ class Game:
             # But what if you have files named 'explosion0.ogg' to 'explosion5.ogg' and want to randomly choose
             # one of them to play? You can generate a string such as 'explosion3', but to use such a string
             # to access an attribute of Pygame Zero's sounds object, we must use Python's built-in function getattr
-            try:
-                getattr(sounds, name + str(random.randint(0, count - 1))).play()
-            except Exception as e:
-                pass
-
-def p1_controls():
-    move = 0
+            # Rather than doing this every time a sound is played, the first time we're asked for a particular sound
+            # we look up all of its varieties and store them in a list in a dictionary, so that next time we can just
+            # pick one from the list. Any which couldn't be loaded are stored as None.
+            variants = self.sound_cache.get(name)
+            if variants is None:
+                variants = []
+                for i in range(count):
+                    try:
+                        variants.append(getattr(sounds, name + str(i)))
+                    except Exception:
+                        variants.append(None)
+                self.sound_cache[name] = variants
+
+            # We always choose a random number, even if the sound we pick couldn't be loaded, as the AI players also
+            # use random numbers - so whether a sound exists mustn't change the sequence of numbers they get
+            sound = variants[random.randint(0, count - 1)]
+            if sound:
+                try:
+                    sound.play()
+                except Exception:
+                    pass
+
+# As in Ball.update, the default parameters give these functions local names for the keyboard object and the
+# player speed, as they are called every frame
+def p1_controls(keyboard=keyboard, PLAYER_SPEED=PLAYER_SPEED):
     if keyboard.z or keyboard.down:
-        move = PLAYER_SPEED
-    elif keyboard.a or keyboard.up:
-        move = -PLAYER_SPEED
-    return move
+        return PLAYER_SPEED
+    if keyboard.a or keyboard.up:
+        return -PLAYER_SPEED
+    return 0
 
-def p2_controls():
-    move = 0
+def p2_controls(keyboard=keyboard, PLAYER_SPEED=PLAYER_SPEED):
     if keyboard.m:
-        move = PLAYER_SPEED
-    elif keyboard.k:
-        move = -PLAYER_SPEED
-    return move
+        return PLAYER_SPEED
+    if keyboard.k:
+        return -PLAYER_SPEED
+    return 0
 
 class State(Enum):
     MENU = 1
@@ -401,10 +527,9 @@ def update():
 
     # Work out whether the space key has just been pressed - i.e. in the previous frame it wasn't down,
     # and in this frame it is.
-    space_pressed = False
-    if keyboard.space and not space_down:
-        space_pressed = True
-    space_down = keyboard.space
+    space = keyboard.space
+    space_pressed = space and not space_down
+    space_down = space
 
     if state == State.MENU:
         if space_pressed:
@@ -447,7 +572,7 @@ def draw():
     game.draw()
 
     if state == State.MENU:
-        menu_image = "menu" + str(num_players - 1)
+        menu_image = MENU_IMAGES[num_players - 1]
         screen.blit(menu_image, (0,0))
 
     elif state == State.GAME_OVER:
@@ -471,5 +596,19 @@ state = State.MENU
 # Create a new Game object, without any players
 game = Game()
 
+# If the game was started with the --profile option (e.g. 'python3 boing.py --profile'), use Python's built-in
+# profiler to measure how much time is spent in each function. When the game exits, the results are saved to
+# boing.prof, which can be viewed with a tool such as SnakeViz ('snakeviz boing.prof')
+if "--profile" in sys.argv:
+    import cProfile, atexit
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    def save_profile():
+        profiler.disable()
+        profiler.dump_stats("boing.prof")
+
+    atexit.register(save_profile)
+
 # Tell Pygame Zero to start - this line is only required when running the game from an IDE such as IDLE or PyCharm
 pgzrun.go()
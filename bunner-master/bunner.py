@@ -1,8 +1,9 @@
 # If the window is too tall to fit on the screen, check your operating system display settings and reduce display
 # scaling if it is enabled.
-import pgzero, pgzrun, pygame, sys
+import pgzero, pgzrun, pygame, sys, os
 from random import *
 from enum import Enum
+from collections import deque
 
 # Check Python version number. sys.version_info gives version as a tuple, e.g. if (3,7,2,'final',0) for version 3.7.2.
 # Unlike many languages, Python can compare two tuples in the same way that you can compare numbers.
@@ -37,16 +38,34 @@ class MyActor(Actor):
 
         self.children = []
 
-    def draw(self, offset_x, offset_y):
-        self.x += offset_x
-        self.y += offset_y
-
-        super().draw()
-        for child_obj in self.children:
-            child_obj.draw(self.x, self.y)
+        # Half the width of the sprite, used when checking for collisions in Row.collide. We work this out once here
+        # rather than each time we check for a collision. Note that this is based on the image the object was
+        # created with - the objects we check for collisions against (cars, logs, hedges, etc) never change image.
+        self.half_width = self.width / 2
 
-        self.x -= offset_x
-        self.y -= offset_y
+    def draw(self, offset_x, offset_y):
+        # Draw this object, followed by each of its children, their children, and so on. Rather than calling the
+        # draw method of each child object (which would in turn call the draw method of its own children), we keep a
+        # list of objects which still need to be drawn, along with the offset to draw each one at. Each time round
+        # the loop we take the last item off the list and draw it. This is known as a stack.
+        stack = [(self, offset_x, offset_y)]
+        while stack:
+            obj, offset_x, offset_y = stack.pop()
+
+            # Draw the sprite at its position plus the offset. We could do this by adding the offset to its
+            # position, calling Actor's draw method and then subtracting the offset again, but it's quicker to just
+            # work out where the sprite needs to go and draw it there ourselves, without changing its position.
+            # topleft gives the position of the top-left corner of the sprite, taking its anchor point into account
+            left, top = obj.topleft
+            screen.blit(obj.image, (left + offset_x, top + offset_y))
+
+            # Child objects are drawn relative to their parent's position. As we take items from the end of the
+            # stack, we add the children in reverse order, so that they're drawn in their original order
+            if obj.children:
+                x = obj.x + offset_x
+                y = obj.y + offset_y
+                for child_obj in reversed(obj.children):
+                    stack.append((child_obj, x, y))
 
     def update(self):
         for child_obj in self.children:
@@ -76,11 +95,18 @@ DIRECTION_LEFT = 3
 
 direction_keys = [keys.UP, keys.RIGHT, keys.DOWN, keys.LEFT]
 
-# X and Y directions indexed into by in_edge and out_edge in Segment
+# Amount to move on the X and Y axes each frame when jumping in each direction
 # The indices correspond to the direction numbers above, i.e. 0 = up, 1 = right, 2 = down, 3 = left
-# Numbers 0 to 3 correspond to up, right, down, left
-DX = [0,4,0,-4]
-DY = [-4,0,4,0]
+# Each element is a tuple of two numbers, so we can get both the X and Y movement with a single lookup
+DIRECTION_STEPS = ((0, -4), (4, 0), (0, 4), (-4, 0))
+
+# Names of the player sprites for each direction, and the frames of the splash animation. The player's sprite is
+# chosen every frame, so rather than joining strings together to make names such as "jump2" each time, we build all
+# the names once here and just look up the one we need
+JUMP_IMAGES = tuple("jump" + str(direction) for direction in range(4))
+SIT_IMAGES = tuple("sit" + str(direction) for direction in range(4))
+SPLAT_IMAGES = tuple("splat" + str(direction) for direction in range(4))
+SPLASH_IMAGES = tuple("splash" + str(frame) for frame in range(8))
 
 class Bunner(MyActor):
     MOVE_DISTANCE = 10
@@ -94,7 +120,8 @@ class Bunner(MyActor):
         self.timer = 0
 
         # If a control input is pressed while the rabbit is in the middle of jumping, it's added to the input queue
-        self.input_queue = []
+        # A deque (double-ended queue) is like a list, but removing items from the start of it is much quicker
+        self.input_queue = deque()
 
         # Keeps track of the furthest distance we've reached so far in the level, for scoring
         # (Level Y coordinates decrease as the screen scrolls)
@@ -103,26 +130,30 @@ class Bunner(MyActor):
     def handle_input(self, dir):
         # Find row that player is trying to move to. This may or may not be the row they're currently standing on,
         # depending on whether the proposed movement would take them onto a different row
-        for row in game.rows:
-            if row.y == self.y + Bunner.MOVE_DISTANCE * DY[dir]:
-                # Found the target row
-                # Can the player move to the new location? Can't move if there's something in the way
-                # (or if the new location is off the screen)
-                if row.allow_movement(self.x + Bunner.MOVE_DISTANCE * DX[dir]):
-                    # It's okay to move here, so set direction and timer. Player will move one pixel per frame
-                    # for the specified number of frames
-                    self.direction = dir
-                    self.timer = Bunner.MOVE_DISTANCE
-                    game.play_sound("jump", 1)
-
-                # No need to continue searching
-                return
+        dx, dy = DIRECTION_STEPS[dir]
+        row = game.get_row(self.y + Bunner.MOVE_DISTANCE * dy)
+
+        # Can the player move to the new location? Can't move if there's something in the way
+        # (or if the new location is off the screen)
+        if row and row.allow_movement(self.x + Bunner.MOVE_DISTANCE * dx):
+            # It's okay to move here, so set direction and timer. Player will move one pixel per frame
+            # for the specified number of frames
+            self.direction = dir
+            self.timer = Bunner.MOVE_DISTANCE
+            game.play_sound("jump", 1)
 
     def update(self):
-        # Check each control direction
-        for direction in range(4):
-            if key_just_pressed(direction_keys[direction]):
-                self.input_queue.append(direction)
+        # Check each control direction. direction_keys_just_pressed gives us a number in which each bit represents
+        # one direction (see that function for details). If the number is zero, no direction keys were just pressed.
+        pressed = direction_keys_just_pressed()
+        while pressed:
+            # pressed & -pressed gives a number with only the lowest bit of pressed set, and bit_length tells us which
+            # bit that is - so this gives us the lowest direction number whose key was pressed
+            direction = (pressed & -pressed).bit_length() - 1
+            self.input_queue.append(direction)
+
+            # Clear the lowest bit, so that next time round the loop we'll look at the next direction
+            pressed &= pressed - 1
 
         if self.state == PlayerState.ALIVE:
             # While the player is alive, the timer variable is used for movement. If it's zero, the player is on
@@ -131,21 +162,18 @@ class Bunner(MyActor):
             # Are we on the ground, and are there inputs to process?
             if self.timer == 0 and len(self.input_queue) > 0:
                 # Take the next input off the queue and process it
-                self.handle_input(self.input_queue.pop(0))
+                self.handle_input(self.input_queue.popleft())
 
             land = False
             if self.timer > 0:
                 # Apply movement
-                self.x += DX[self.direction]
-                self.y += DY[self.direction]
+                dx, dy = DIRECTION_STEPS[self.direction]
+                self.x += dx
+                self.y += dy
                 self.timer -= 1
                 land = self.timer == 0      # If timer reaches zero, we've just landed
 
-            current_row = None
-            for row in game.rows:
-                if row.y == self.y:
-                    current_row = row
-                    break
+            current_row = game.get_row(self.y)
 
             if current_row:
                 # Row.check receives the player's X coordinate and returns the new state the player should be in
@@ -167,7 +195,7 @@ class Bunner(MyActor):
                 else:
                     if self.state == PlayerState.SPLAT:
                         # Add 'splat' graphic to current row with the specified position and Y offset
-                        current_row.children.insert(0, MyActor("splat" + str(self.direction), (self.x, dead_obj_y_offset)))
+                        current_row.children.insert(0, MyActor(SPLAT_IMAGES[self.direction], (self.x, dead_obj_y_offset)))
                     self.timer = 100
             else:
                 # There's no current row - either because player is currently changing row, or the row they were on
@@ -180,29 +208,33 @@ class Bunner(MyActor):
                     game.play_sound("eagle")
 
             # Limit x position so player doesn't go off the screen. The player movement code doesn't allow jumping off
-            # the screen, but without this line, the player could be carried off the screen by a log
-            self.x = max(16, min(WIDTH - 16, self.x))
+            # the screen, but without these lines, the player could be carried off the screen by a log
+            if self.x < 16:
+                self.x = 16
+            elif self.x > WIDTH - 16:
+                self.x = WIDTH - 16
         else:
             # Not alive - timer now counts down prior to game over screen
             self.timer -= 1
 
         # Keep track of the furthest we've got in the level
-        self.min_y = min(self.min_y, self.y)
+        if self.y < self.min_y:
+            self.min_y = self.y
 
         # Choose sprite image
         self.image = "blank"
         if self.state == PlayerState.ALIVE:
             if self.timer > 0:
-                self.image = "jump" + str(self.direction)
+                self.image = JUMP_IMAGES[self.direction]
             else:
-                self.image = "sit" + str(self.direction)
+                self.image = SIT_IMAGES[self.direction]
         elif self.state == PlayerState.SPLASH and self.timer > 84:
             # Display appropriate 'splash' animation frame. Note that we use a different technique to display the
             # 'splat' image - see: comments earlier in this method. The reason two different techniques are used is
             # that the splash image should be drawn on top of other objects, whereas the splat image must be drawn
             # underneath other objects. Since the player is always drawn on top of other objects, changing the player
             # sprite is a suitable method of displaying the splash image.
-            self.image = "splash" + str(int((100 - self.timer) / 2))
+            self.image = SPLASH_IMAGES[(100 - self.timer) // 2]
 
 # Mover is the base class for Car, Log and Train
 # The thing they all have in common, besides inheriting from MyActor, is that they need to store whether they're
@@ -222,8 +254,12 @@ class Car(Mover):
     SOUND_ZOOM = 0
     SOUND_HONK = 1
 
+    # Names of the car sprites. There are four types of car, each with a left-facing (0) and right-facing (1) sprite.
+    # For example, IMAGES[2][1] is "car21"
+    IMAGES = tuple(tuple("car" + str(car_type) + str(facing) for facing in range(2)) for car_type in range(4))
+
     def __init__(self, dx, pos):
-        image = "car" + str(randint(0, 3)) + ("0" if dx < 0 else "1")
+        image = Car.IMAGES[randint(0, 3)][0 if dx < 0 else 1]
         super().__init__(dx, image, pos)
 
         # Cars have two sound effects. Each can only play once. We use this
@@ -239,19 +275,29 @@ class Car(Mover):
             self.played[num] = True
 
 class Log(Mover):
+    IMAGES = ("log0", "log1")
+
     def __init__(self, dx, pos):
-        image = "log" + str(randint(0, 1))
+        image = Log.IMAGES[randint(0, 1)]
         super().__init__(dx, image, pos)
 
 class Train(Mover):
+    # As with cars, there are three types of train, each with a left-facing and right-facing sprite
+    IMAGES = tuple(tuple("train" + str(train_type) + str(facing) for facing in range(2)) for train_type in range(3))
+
     def __init__(self, dx, pos):
-        image = "train"  +str(randint(0, 2)) + ("0" if dx < 0 else "1")
+        image = Train.IMAGES[randint(0, 2)][0 if dx < 0 else 1]
         super().__init__(dx, image, pos)
 
 # Row is the base class for Pavement, Grass, Dirt, Rail and ActiveRow
 # Each row corresponds to one of the 40 pixel high images which make up sections of grass, road, etc.
 # The last row of each section is 60 pixels high and overlaps with the row above
 class Row(MyActor):
+    # Only Grass rows can have hedges, and they set this to 0 or 1 if they do - see Grass.__init__. Other types of row
+    # never have hedges, so by setting a default value of None here, we can check whether any row has hedges without
+    # first having to check whether it's a Grass row
+    hedge_row_index = None
+
     def __init__(self, base_image, index, y):
         # base_image and index form the name of the image file to use
         # Last argument is the anchor point to use
@@ -271,8 +317,12 @@ class Row(MyActor):
         # Check to see if the given X coordinate is in contact with any of this row's child objects (e.g. logs, cars,
         # hedges). A negative margin makes the collideable area narrower than the child object's sprite, while a
         # positive margin makes the collideable area wider.
+        # Rather than adding the margin to every child object's edges, we apply it to the X coordinate once, before
+        # the loop. Checking x >= left - margin is the same as checking x + margin >= left, and so on.
+        x_plus_margin = x + margin
+        x_minus_margin = x - margin
         for child_obj in self.children:
-            if x >= child_obj.x - (child_obj.width / 2) - margin and x < child_obj.x + (child_obj.width / 2) + margin:
+            if x_plus_margin >= child_obj.x - child_obj.half_width and x_minus_margin < child_obj.x + child_obj.half_width:
                 return child_obj
 
         return None
@@ -299,17 +349,26 @@ class ActiveRow(Row):
         self.dx = choice(dxs)   # Randomly choose a direction for cars/logs to move
 
         # Populate the row with child objects (cars or logs). Without this, the row would initially be empty.
+        # Each one is between 240 and 480 pixels further along than the last. random() gives us a number between 0
+        # and 1, so multiplying it by 241 and rounding down gives a whole number from 0 to 240 - this has the same
+        # result as randint(240, 480), but is quicker, as randint does quite a lot of work behind the scenes
         x = -WIDTH / 2 - 70
         while x < WIDTH / 2 + 70:
-            x += randint(240, 480)
+            x += 240 + int(random() * 241)
             pos = (WIDTH / 2 + (x if self.dx > 0 else -x), 0)
             self.children.append(self.child_type(self.dx, pos))
 
     def update(self):
         super().update()
 
-        # Recreate the children list, excluding any which are too far off the edge of the screen to be visible
-        self.children = [c for c in self.children if c.x > -70 and c.x < WIDTH + 70]
+        # Recreate the children list, excluding any which are too far off the edge of the screen to be visible.
+        # Most of the time, none of the children have gone off the screen, so we first check to see if there are any
+        # that need removing, and only recreate the list if we find one. This saves us from creating a brand new
+        # list for every row on every frame.
+        for child_obj in self.children:
+            if child_obj.x <= -70 or child_obj.x >= WIDTH + 70:
+                self.children = [c for c in self.children if c.x > -70 and c.x < WIDTH + 70]
+                break
 
         self.timer -= 1
 
@@ -338,10 +397,10 @@ def generate_hedge_mask():
 
     # We then widen gaps to a minimum of 3 tiles. This happens in two steps.
     # First, we recreate the mask list, except this time whether a gap is present is based on whether there was a gap
-    # in either the original element or its neighbouring elements. When using Python's built-in sum function, a value
-    # of True is treated as 1 and False as 0. We must use the min/max functions to ensure that we don't try to look
-    # at a neighbouring element which doesn't exist (e.g. there is no neighbour to the right of the last element)
-    mask = [sum(mask[max(0, i-1):min(12, i+2)]) > 0 for i in range(12)]
+    # in either the original element or its neighbouring elements. We must use the min/max functions to ensure that
+    # we don't try to look at a neighbouring element which doesn't exist (e.g. there is no neighbour to the right of
+    # the last element) - at the edges, we just look at the element itself again instead.
+    mask = [mask[max(0, i-1)] or mask[i] or mask[min(11, i+1)] for i in range(12)]
 
     # We want to ensure gaps are a minimum of 3 tiles wide, but the previous line only ensures a minimum gap of 2 tiles
     # at the edges. The last step is to return a new list consisting of the old list with the first and last elements duplicated
@@ -383,6 +442,25 @@ def classify_hedge_segment(mask, previous_mid_segment):
         # Not a middle piece
         return sprite_x, None
 
+# The result of classify_hedge_segment depends only on the four mask values and previous_mid_segment, so there are
+# only 48 different combinations of inputs (2*2*2*2 possible masks, and 3 possible values of previous_mid_segment).
+# Rather than working out the answer each time, we call the function once for each combination here, and store the
+# results in a dictionary. The keys of the dictionary are tuples of the five inputs.
+HEDGE_SEGMENT_TABLE = {}
+for m0 in (False, True):
+    for m1 in (False, True):
+        for m2 in (False, True):
+            for m3 in (False, True):
+                for previous in (None, 3, 4):
+                    HEDGE_SEGMENT_TABLE[(m0, m1, m2, m3, previous)] = classify_hedge_segment((m0, m1, m2, m3), previous)
+
+# Grass and Dirt rows are made up of a sequence of images. The index of the next row in the sequence depends only on
+# the index of the current row, so rather than working it out each time with a series of if/elif statements, we look
+# it up in this tuple. For example, NEXT_GRASS_OR_DIRT_INDEX[6] is 7, so after grass6 comes grass7. Indices 0 to 5
+# are followed by 8 to 13, 6 is followed by 7, 7 by 15, and 8 to 14 by the next index up. None means that the
+# sequence has finished (after index 15), and a different type of row should come next.
+NEXT_GRASS_OR_DIRT_INDEX = (8, 9, 10, 11, 12, 13, 7, 15, 9, 10, 11, 12, 13, 14, 15, None)
+
 class Grass(Row):
     def __init__(self, predecessor, index, y):
         super().__init__("grass", index, y)
@@ -396,7 +474,8 @@ class Grass(Row):
         self.hedge_row_index = None     # 0 or 1, or None if no hedges on this row
         self.hedge_mask = None
 
-        if not isinstance(predecessor, Grass) or predecessor.hedge_row_index == None:
+        # The very first row has no predecessor, in which case predecessor will be None
+        if predecessor == None or predecessor.hedge_row_index == None:
             # Create a brand-new set of hedges? We will only create hedges if the previous row didn't have any.
             # We also only want hedges to appear on certain types of grass row, and on only a random selection
             # of rows
@@ -408,31 +487,29 @@ class Grass(Row):
             self.hedge_row_index = 1
 
         if self.hedge_row_index != None:
-            # See comments in classify_hedge_segment for explanation of previous_mid_segment
+            # See comments in classify_hedge_segment for explanation of previous_mid_segment. Instead of calling that
+            # function, we look up the answer in HEDGE_SEGMENT_TABLE
+            mask = self.hedge_mask
             previous_mid_segment = None
             for i in range(1, 13):
-                sprite_x, previous_mid_segment = classify_hedge_segment(self.hedge_mask[i - 1:i + 3], previous_mid_segment)
+                sprite_x, previous_mid_segment = HEDGE_SEGMENT_TABLE[(mask[i - 1], mask[i], mask[i + 1], mask[i + 2], previous_mid_segment)]
                 if sprite_x != None:
                     self.children.append(Hedge(sprite_x, self.hedge_row_index, (i * 40 - 20, 0)))
 
     def allow_movement(self, x):
         # allow_movement in the base class ensures that the player can't walk off the left and right sides of the
         # screen. The call to our own collide method ensures that the player can't walk through hedges. The margin of
-        # 8 prevents the player sprite from overlapping with the edge of a hedge.
-        return super().allow_movement(x) and not self.collide(x, 8)
+        # 8 prevents the player sprite from overlapping with the edge of a hedge. Most grass rows don't have any hedges,
+        # in which case there's nothing to collide with, so we don't need to call collide at all.
+        return super().allow_movement(x) and (self.hedge_row_index == None or not self.collide(x, 8))
 
     def play_sound(self):
         game.play_sound("grass", 1)
 
     def next(self):
-        if self.index <= 5:
-            row_class, index = Grass, self.index + 8
-        elif self.index == 6:
-            row_class, index = Grass, 7
-        elif self.index == 7:
-            row_class, index = Grass, 15
-        elif self.index >= 8 and self.index <= 14:
-            row_class, index = Grass, self.index + 1
+        index = NEXT_GRASS_OR_DIRT_INDEX[self.index]
+        if index != None:
+            row_class = Grass
         else:
             row_class, index = choice((Road, Water)), 0
 
@@ -447,14 +524,10 @@ class Dirt(Row):
         game.play_sound("dirt", 1)
 
     def next(self):
-        if self.index <= 5:
-            row_class, index = Dirt, self.index + 8
-        elif self.index == 6:
-            row_class, index = Dirt, 7
-        elif self.index == 7:
-            row_class, index = Dirt, 15
-        elif self.index >= 8 and self.index <= 14:
-            row_class, index = Dirt, self.index + 1
+        # See NEXT_GRASS_OR_DIRT_INDEX above - Dirt rows follow the same sequence as Grass rows
+        index = NEXT_GRASS_OR_DIRT_INDEX[self.index]
+        if index != None:
+            row_class = Dirt
         else:
             row_class, index = choice((Road, Water)), 0
 
@@ -512,11 +585,16 @@ class Water(ActiveRow):
         return row_class(self, index, self.y - ROW_HEIGHT)
 
 class Road(ActiveRow):
+    # Specify the possible directions and speeds from which the movement of cars on this row will be chosen
+    # We use Python's set data structure to specify that the car velocities on this row will be any of the numbers
+    # from -5 to 5, except for zero or the velocity of the cars on the previous row. The previous row's velocity is
+    # always a number from -5 to 5 (it's zero if it's not a Road or Water row), so rather than working out the list
+    # each time a new Road is created, we work out the list for each possible previous velocity just once, and store
+    # them in a dictionary.
+    DXS_BY_PREDECESSOR_DX = {predecessor_dx: list(set(range(-5, 6)) - set([0, predecessor_dx])) for predecessor_dx in range(-5, 6)}
+
     def __init__(self, predecessor, index, y):
-        # Specify the possible directions and speeds from which the movement of cars on this row will be chosen
-        # We use Python's set data structure to specify that the car velocities on this row will be any of the numbers
-        # from -5 to 5, except for zero or the velocity of the cars on the previous row
-        dxs = list(set(range(-5, 6)) - set([0, predecessor.dx]))
+        dxs = Road.DXS_BY_PREDECESSOR_DX[predecessor.dx]
         super().__init__(Car, dxs, "road", index, y)
 
     def update(self):
@@ -524,20 +602,28 @@ class Road(ActiveRow):
 
         # Trigger car sound effects. The zoom effect should play when the player is on the row above or below the car,
         # the honk effect should play when the player is on the same row.
-        for y_offset, car_sound_num in [(-ROW_HEIGHT, Car.SOUND_ZOOM), (0, Car.SOUND_HONK), (ROW_HEIGHT, Car.SOUND_ZOOM)]:
-            # Is the player on the appropriate row?
-            if game.bunner and game.bunner.y == self.y + y_offset:
-                for child_obj in self.children:
-                    # The child object must be a car
-                    if isinstance(child_obj, Car):
-                        # The car must be within 100 pixels of the player on the x-axis, and moving towards the player
-                        # child_obj.dx < 0 is True or False depending on whether the car is moving left or right, and
-                        # dx < 0 is True or False depending on whether the player is to the left or right of the car.
-                        # If the results of these two comparisons are different, the car is moving towards the player.
-                        # Also, for the zoom sound, the car must be travelling faster than one pixel per frame
-                        dx = child_obj.x - game.bunner.x
-                        if abs(dx) < 100 and ((child_obj.dx < 0) != (dx < 0)) and (y_offset == 0 or abs(child_obj.dx) > 1):
-                            child_obj.play_sound(car_sound_num)
+        if game.bunner:
+            # Work out which row the player is on compared to this one. If it's not this row or one of the rows either
+            # side of it, there are no sounds to play
+            y_offset = game.bunner.y - self.y
+            if y_offset == 0:
+                car_sound_num = Car.SOUND_HONK
+            elif y_offset == -ROW_HEIGHT or y_offset == ROW_HEIGHT:
+                car_sound_num = Car.SOUND_ZOOM
+            else:
+                return
+
+            for child_obj in self.children:
+                # The child object must be a car - it could also be the 'splat' sprite left behind by the player
+                if isinstance(child_obj, Car):
+                    # The car must be within 100 pixels of the player on the x-axis, and moving towards the player
+                    # child_obj.dx < 0 is True or False depending on whether the car is moving left or right, and
+                    # dx < 0 is True or False depending on whether the player is to the left or right of the car.
+                    # If the results of these two comparisons are different, the car is moving towards the player.
+                    # Also, for the zoom sound, the car must be travelling faster than one pixel per frame
+                    dx = child_obj.x - game.bunner.x
+                    if abs(dx) < 100 and ((child_obj.dx < 0) != (dx < 0)) and (y_offset == 0 or abs(child_obj.dx) > 1):
+                        child_obj.play_sound(car_sound_num)
 
     def check_collision(self, x):
         if self.collide(x):
@@ -635,6 +721,21 @@ class Rail(Row):
         # Create an object of the chosen row class
         return row_class(self, index, self.y - ROW_HEIGHT)
 
+# Looped sound effects which play when the player is near rows of certain types - the river sound for Water rows,
+# and the traffic sound for Road rows. Each entry gives the name of the sound and the number of varieties of it
+# (see Game.loop_sound)
+LOOPED_ROW_SOUNDS = {Water: ("river", 2), Road: ("traffic", 3)}
+
+# How much a Water or Road row contributes to the volume of its looped sound, for each possible distance in pixels
+# between the row and the player. The closer the row, the louder the sound, up to a maximum of 1 for any row within
+# 16 pixels. Game.update needs these numbers for many rows every frame, so we work them out once here instead of
+# doing a division for each row. A dictionary is used rather than a list because Actor positions can be floating
+# point numbers - e.g. 40.0 rather than 40 - which can be used to look up a dictionary entry but not a list item.
+VOLUME_BY_DISTANCE = {distance: 16.0 / max(16.0, distance) for distance in range(HEIGHT * 2)}
+
+# Dictionary of sound effects which have been played so far - see Game.get_sounds
+sound_cache = {}
+
 class Game:
     def __init__(self, bunner=None):
         self.bunner = bunner
@@ -660,131 +761,202 @@ class Game:
     def update(self):
         if self.bunner:
             # Scroll faster if the player is close to the top of the screen. Limit scroll speed to
-            # between 1 and 3 pixels per frame.
-            self.scroll_pos -= max(1, min(3, float(self.scroll_pos + HEIGHT - self.bunner.y) / (HEIGHT // 4)))
+            # between 1 and 3 pixels per frame. As with the player's position in Bunner.update, we use comparisons
+            # to limit the speed rather than calling the min and max functions.
+            speed = (self.scroll_pos + HEIGHT - self.bunner.y) / (HEIGHT // 4)
+            if speed < 1:
+                speed = 1
+            elif speed > 3:
+                speed = 3
+            self.scroll_pos -= speed
         else:
             self.scroll_pos -= 1
 
-        # Recreate the list of rows, excluding any which have scrolled off the bottom of the screen
-        self.rows = [row for row in self.rows if row.y < int(self.scroll_pos) + HEIGHT + ROW_HEIGHT * 2]
+        # Get the scroll position as a whole number, as we need it several times below
+        scroll_y = int(self.scroll_pos)
+
+        # Remove any rows which have scrolled off the bottom of the screen. The first row in the list is always the
+        # bottom one, so these will all be at the start of the list. We count how many there are and then remove them
+        # all at once, rather than recreating the whole list every frame. On most frames, no rows are removed at all.
+        expired = 0
+        bottom_y = scroll_y + HEIGHT + ROW_HEIGHT * 2
+        while self.rows[expired].y >= bottom_y:
+            expired += 1
+        if expired > 0:
+            del self.rows[:expired]
 
         # In Python, a negative index into a list gives you items in reverse order, e.g. my_list[-1] gives you the
         # last element of a list. Here, we look at the last row in the list - which is the top row - and check to see
         # if it has scrolled sufficiently far down that we need to add a new row above it. This may need to be done
         # multiple times - particularly when the game starts, as only one row is added to begin with.
-        while self.rows[-1].y > int(self.scroll_pos)+ROW_HEIGHT:
+        while self.rows[-1].y > scroll_y + ROW_HEIGHT:
             new_row = self.rows[-1].next()
             self.rows.append(new_row)
 
-        # Update all rows, and the player and eagle (if present)
-        for obj in self.rows + [self.bunner, self.eagle]:
-            if obj:
-                obj.update()
+        # Update all rows, and the player and eagle (if present). We update the rows separately rather than joining
+        # the player and eagle onto the list of rows, as that would create a brand new list every frame.
+        # The bunner creates the eagle when the player has been standing still for too long. We get the eagle before
+        # updating the bunner, so that a new eagle isn't updated until the next frame
+        eagle = self.eagle
+        for row in self.rows:
+            row.update()
+        if self.bunner:
+            self.bunner.update()
+        if eagle:
+            eagle.update()
 
         # Play river and traffic sound effects, and adjust volume each frame based on the player's proximity to rows
         # of the appropriate types. For each such row, a number is generated representing how much the row should
         # contribute to the volume of the sound effect. These numbers are added together by Python's sum function.
         # On the following line we ensure that the volume can never be above 40% of the maximum possible volume.
         if self.bunner:
-            for name, count, row_class in [("river", 2, Water), ("traffic", 3, Road)]:
-                # The first line uses a list comprehension to get each row of the appropriate type, e.g. Water rows
-                # if we're currently updating the "river" sound effect.
-                volume = sum([16.0 / max(16.0, abs(r.y - self.bunner.y)) for r in self.rows if isinstance(r, row_class)]) - 0.2
-                volume = min(0.4, volume)
-                self.loop_sound(name, count, volume)
+            # Rather than going through the list of rows once for each sound effect, we go through it once, adding
+            # each row's contribution to the total for the appropriate sound. The totals dictionary has an entry for
+            # each row class which has a looped sound. type(row) gives us the class of the row, which we can then look
+            # up in the dictionary - rows of other types (e.g. Grass) won't have an entry.
+            bunner_y = self.bunner.y
+            totals = {row_class: 0 for row_class in LOOPED_ROW_SOUNDS}
+            for row in self.rows:
+                row_class = type(row)
+                if row_class in totals:
+                    # Look up the row's contribution in VOLUME_BY_DISTANCE (see above). Positions are always whole
+                    # numbers, so the distance will normally be in the table - if it isn't, we work it out ourselves
+                    distance = abs(row.y - bunner_y)
+                    contribution = VOLUME_BY_DISTANCE.get(distance)
+                    if contribution is None:
+                        contribution = 16.0 / max(16.0, distance)
+                    totals[row_class] += contribution
+
+            for row_class, (name, count) in LOOPED_ROW_SOUNDS.items():
+                volume = min(0.4, totals[row_class] - 0.2)
+                # Most of the time the player isn't near enough to any river or road for the sound to be heard, and
+                # the sound isn't already playing. In that case, loop_sound wouldn't do anything, so we don't call it.
+                if volume > 0 or name in self.looped_sounds:
+                    self.loop_sound(name, count, volume)
 
         return self
 
     def draw(self):
-        # Create a list of all objects which need to be drawn. This includes all rows, plus the player
-        # Using list(s.rows) means we're creating a copy of that list to use - we don't want to create a reference
-        # to it as that would mean we're modifying the original list's contents
-        all_objs = list(self.rows)
-
-        if self.bunner:
-            all_objs.append(self.bunner)
-
-        # We want to draw objects in order based on their Y position. In general, objects further down the screen should be drawn
-        # after (and therefore in front of) objects higher up the screen. We can use Python's built-in sort function
-        # to put the items in the desired order, before we draw the  The following function specifies the criteria
-        # used to decide how the objects are sorted.
-        def sort_key(obj):
-            # Adding 39 and then doing an integer divide by 40 (the height of each row) deals with the situation where
-            # the player sprite would otherwise be drawn underneath the row below. This could happen when the player
-            # is moving up or down. If you assume that it occupies a 40x40 box which can be at an arbitrary y offset,
-            # it generates the row number of the bottom row that that box overlaps. If the player happens to be
-            # perfectly aligned to a row, adding 39 and dividing by 40 has no effect on the result. If it isn't, even
-            # by a single pixel, the +39 causes it to be drawn one row later.
-            return (obj.y + 39) // ROW_HEIGHT
-
-        # Sort list using the above function to determine order
-        all_objs.sort(key=sort_key)
+        # Draw all rows, plus the player and the eagle.
+        # We want to draw objects in order based on their Y position. In general, objects further down the screen
+        # should be drawn after (and therefore in front of) objects higher up the screen. We could put everything in
+        # a list and use Python's built-in sort function to put the items in the desired order, but the rows are
+        # already in order - self.rows starts with the bottom row and ends with the top one - so we just go through
+        # them in reverse, drawing each one as we go, and the only thing we need to work out is when to draw the player.
+        # The player should be drawn after the row they're standing on, and after the row below that if they're
+        # currently jumping between the two. Adding 39, doing an integer divide by 40 (the height of each row) and then
+        # multiplying by 40 again deals with the situation where the player sprite would otherwise be drawn underneath
+        # the row below. If you assume that it occupies a 40x40 box which can be at an arbitrary y offset, it
+        # generates the Y position of the bottom row that that box overlaps. If the player happens to be perfectly
+        # aligned to a row, this has no effect on the result. If it isn't, even by a single pixel, the +39 causes it
+        # to be drawn one row later.
+
+        # Get the scroll position as a whole number once, rather than for every object we draw. Each object is drawn
+        # moved up the screen by this amount, so we also work out the Y offset to pass to the draw methods here.
+        scroll_y = int(self.scroll_pos)
+        offset_y = -scroll_y
+
+        # reversed gives us the items of a list in reverse order, without having to create a reversed copy of it
+        bunner = self.bunner
+        if bunner:
+            bunner_row_y = (bunner.y + 39) // ROW_HEIGHT * ROW_HEIGHT
+
+            for row in reversed(self.rows):
+                if bunner and row.y > bunner_row_y:
+                    # We've reached the first row below the player, so the player should be drawn before this row
+                    bunner.draw(0, offset_y)
+                    bunner = None
+                row.draw(0, offset_y)
+
+            # If the player is below all of the rows, they haven't been drawn yet
+            if bunner:
+                bunner.draw(0, offset_y)
+        else:
+            # There's no player on the menu or game over screens, so we just need to draw the rows
+            for row in reversed(self.rows):
+                row.draw(0, offset_y)
 
         # Always draw eagle on top of everything
-        all_objs.append(self.eagle)
-        
-        for obj in all_objs:
-            if obj:
-                # Draw the object, taking the scroll position into account
-                obj.draw(0, -int(self.scroll_pos))
+        if self.eagle:
+            self.eagle.draw(0, offset_y)
 
+        # The row boundaries are drawn on top of everything else, so they need a separate pass after the one above.
+        # Everything in self.rows is a Row, so unlike when this went through a list of all objects, there's no need
+        # to check each item's type
         if DEBUG_SHOW_ROW_BOUNDARIES:
-            for obj in all_objs:
-                if obj and isinstance(obj, Row):
-                    pygame.draw.rect(screen.surface, (255, 255, 255), pygame.Rect(obj.x, obj.y - int(self.scroll_pos), screen.surface.get_width(), ROW_HEIGHT), 1)
-                    screen.draw.text(str(obj.index), (obj.x, obj.y - int(self.scroll_pos) - ROW_HEIGHT))
+            width = screen.surface.get_width()
+            for row in reversed(self.rows):
+                pygame.draw.rect(screen.surface, (255, 255, 255), pygame.Rect(row.x, row.y - scroll_y, width, ROW_HEIGHT), 1)
+                screen.draw.text(str(row.index), (row.x, row.y - scroll_y - ROW_HEIGHT))
+
+    def get_row(self, y):
+        # Returns the row at the given Y position, or None if there isn't one (e.g. if the position is in between two
+        # rows). Rather than checking each row in turn, we can work out where the row must be in the list. The first
+        # row in the list is the bottom one, and each row is ROW_HEIGHT pixels above the one before it, so the row
+        # at position y is (first row's Y position - y) / ROW_HEIGHT places along the list.
+        # Pygame Zero stores Actor positions as floats, so divmod gives us a float index, which we must convert to an
+        # int before we can use it to index the list
+        index, remainder = divmod(self.rows[0].y - y, ROW_HEIGHT)
+        if remainder == 0 and 0 <= index < len(self.rows):
+            return self.rows[int(index)]
+        return None
 
     def score(self):
         return int(-320 - game.bunner.min_y) // 40
 
     def play_sound(self, name, count=1):
-        try:
-            # Some sounds have multiple varieties. If count > 1, we'll randomly choose one from those
-            # We don't play any sounds if there is no player (e.g. if we're on the menu)
-            if self.bunner:
-                # Pygame Zero allows you to write things like 'sounds.explosion.play()'
-                # This automatically loads and plays a file named 'explosion.wav' (or .ogg) from the sounds folder (if
-                # such a file exists)
-                # But what if you have files named 'explosion0.ogg' to 'explosion5.ogg' and want to randomly choose
-                # one of them to play? You can generate a string such as 'explosion3', but to use such a string
-                # to access an attribute of Pygame Zero's sounds object, we must use Python's built-in function getattr
-                sound = getattr(sounds, name + str(randint(0, count - 1)))
-                sound.play()
-        except:
-            # If a sound fails to play, ignore the error
-            pass
+        # Some sounds have multiple varieties. If count > 1, we'll randomly choose one from those
+        # We don't play any sounds if there is no player (e.g. if we're on the menu), or if the sound system isn't
+        # working (see the end of this file)
+        if self.bunner and sound_enabled:
+            # Pygame Zero allows you to write things like 'sounds.explosion.play()'
+            # This automatically loads and plays a file named 'explosion.wav' (or .ogg) from the sounds folder (if
+            # such a file exists)
+            # But what if you have files named 'explosion0.ogg' to 'explosion5.ogg' and want to randomly choose
+            # one of them to play? You can generate a string such as 'explosion3', but to use such a string
+            # to access an attribute of Pygame Zero's sounds object, we must use Python's built-in function getattr
+            # We only need to do that the first time each sound is played - see get_sounds below
+            sound = self.get_sounds(name, count)[randint(0, count - 1)]
+            sound.play()
 
     def loop_sound(self, name, count, volume):
-        try:
-            # Similar to play_sound above, but for looped sounds we need to keep a reference to the sound so that we can
-            # later modify its volume or turn it off. We use the dictionary self.looped_sounds for this - the sound
-            # effect name is the key, and the value is the corresponding sound reference.
-            if volume > 0 and not name in self.looped_sounds:
-                full_name = name + str(randint(0, count - 1))
-                sound = getattr(sounds, full_name)      # see play_sound method above for explanation
-                sound.play(-1)  # -1 means sound will loop indefinitely
-                self.looped_sounds[name] = sound
-
-            if name in self.looped_sounds:
-                sound = self.looped_sounds[name]
-                if volume > 0:
-                    sound.set_volume(volume)
-                else:
-                    sound.stop()
-                    del self.looped_sounds[name]
-        except:
-            # If a sound fails to play, ignore the error
-            pass
+        # Similar to play_sound above, but for looped sounds we need to keep a reference to the sound so that we can
+        # later modify its volume or turn it off. We use the dictionary self.looped_sounds for this - the sound
+        # effect name is the key, and the value is the corresponding sound reference.
+        if not sound_enabled:
+            return
+
+        if volume > 0 and not name in self.looped_sounds:
+            sound = self.get_sounds(name, count)[randint(0, count - 1)]     # see play_sound method above
+            sound.play(-1)  # -1 means sound will loop indefinitely
+            self.looped_sounds[name] = sound
+
+        if name in self.looped_sounds:
+            sound = self.looped_sounds[name]
+            if volume > 0:
+                sound.set_volume(volume)
+            else:
+                sound.stop()
+                del self.looped_sounds[name]
+
 
+    def get_sounds(self, name, count):
+        # Returns a list of all the varieties of the given sound, e.g. for "honk" with a count of 4, the list contains
+        # sounds.honk0 to sounds.honk3. Building the names and looking each one up with getattr isn't something we
+        # want to do every time a sound is played, so the first time we're asked for a sound, we store the list in
+        # the sound_cache dictionary, and from then on we can just look it up there.
+        sound_list = sound_cache.get(name)
+        if sound_list is None:
+            sound_list = [getattr(sounds, name + str(i)) for i in range(count)]
+            sound_cache[name] = sound_list
+        return sound_list
 
     def stop_looped_sounds(self):
-        try:
-            for sound in self.looped_sounds.values():
-                sound.stop()
-            self.looped_sounds.clear()
-        except:
-            # If sound system is not working/present, ignore the error
-            pass
+        # If the sound system is not working/present, loop_sound won't have started any sounds, so there won't be
+        # anything in self.looped_sounds
+        for sound in self.looped_sounds.values():
+            sound.stop()
+        self.looped_sounds.clear()
 
 # Dictionary to keep track of which keys are currently being held down
 key_status = {}
@@ -798,21 +970,45 @@ def key_just_pressed(key):
     # when the key is not present.
     prev_status = key_status.get(key, False)
 
+    # Get key's current status. We need it twice below, so we only ask Pygame Zero's keyboard object for it once
+    status = keyboard[key]
+
     # If the key wasn't previously being pressed, but it is now, we're going to return True
-    if not prev_status and keyboard[key]:
+    if not prev_status and status:
         result = True
 
     # Before we return, we need to update the key's entry in the key_status dictionary (or create an entry if there
     # wasn't one already
-    key_status[key] = keyboard[key]
+    key_status[key] = status
 
     return result
 
+# Checks all four direction keys at once. The result is a number in which each bit tells us whether the corresponding
+# direction key was just pressed - bit 0 (value 1) for up, bit 1 (value 2) for right, bit 2 (value 4) for down and
+# bit 3 (value 8) for left. This works in the same way as key_just_pressed, but reads each key's status only once
+def direction_keys_just_pressed():
+    pressed = 0
+    for direction in range(4):
+        key = direction_keys[direction]
+        key_down = keyboard[key]
+        if key_down and not key_status.get(key, False):
+            # The << operator shifts the number 1 left by the given number of bits, e.g. 1 << 2 is 4
+            pressed |= 1 << direction
+        key_status[key] = key_down
+    return pressed
+
+# Sprite names for each digit in each colour, e.g. DIGIT_IMAGES[1]["7"] is "digit17". Working these out once here
+# means display_number doesn't need to build a new string for every digit it draws, every frame
+DIGIT_IMAGES = [{digit: "digit" + str(colour) + digit for digit in "0123456789"} for colour in range(2)]
+
 def display_number(n, colour, x, align):
     # align: 0 for left, 1 for right
     n = str(n)  # Convert number to string
-    for i in range(len(n)):
-        screen.blit("digit" + str(colour) + n[i], (x + (i - len(n) * align) * 25, 0))
+    images = DIGIT_IMAGES[colour]
+    x -= len(n) * align * 25
+    for digit in n:
+        screen.blit(images[digit], (x, 0))
+        x += 25
 
 
 # Pygame Zero calls the update and draw functions each frame
@@ -857,12 +1053,18 @@ def update():
             state = State.MENU
             game = Game()
 
+# The "press space to start" animation on the menu screen goes through the sprites start0, start1, start2, start1,
+# showing each one for 6 frames before moving on to the next. On the menu, game.scroll_pos goes down by one each frame,
+# so the remainder of dividing it by 24 (the length of the whole animation) tells us which frame of the animation we're
+# on. This list has the name of the sprite to show on each of those frames.
+START_IMAGES = ["start" + str([0, 1, 2, 1][frame // 6]) for frame in range(24)]
+
 def draw():
     game.draw()
 
     if state == State.MENU:
         screen.blit("title", (0, 0))
-        screen.blit("start" + str([0, 1, 2, 1][game.scroll_pos // 6 % 4]), ((WIDTH - 270) // 2, HEIGHT - 240))
+        screen.blit(START_IMAGES[game.scroll_pos % 24], ((WIDTH - 270) // 2, HEIGHT - 240))
 
     elif state == State.PLAY:
         # Display score and high score
@@ -878,17 +1080,25 @@ try:
     pygame.mixer.quit()
     pygame.mixer.init(44100, -16, 2, 512)
     pygame.mixer.set_num_channels(16)
-except:
-    # If an error occurs, just ignore it
-    pass
 
-# Load high score from file
-try:
-    with open("high.txt", "r") as f:
-        high_score = int(f.read())
+    # Check whether the sound system is now ready to use. If it isn't, for example because there's no audio device,
+    # Game.play_sound and Game.loop_sound will do nothing, rather than each of them trying to play the sound anyway
+    # and ignoring the resulting error
+    sound_enabled = pygame.mixer.get_init() is not None
 except:
-    # If opening the file fails (likely because it hasn't yet been created), set high score to 0
-    high_score = 0
+    # If an error occurs, just ignore it, but don't try to play any sounds
+    sound_enabled = False
+
+# Load high score from file. The file won't exist the first time the game is run, so rather than trying to open it
+# anyway and dealing with the resulting error, we check whether it exists first, using os.path.exists.
+high_score = 0
+if os.path.exists("high.txt"):
+    try:
+        with open("high.txt", "r") as f:
+            high_score = int(f.read())
+    except (OSError, ValueError):
+        # If reading the file fails, or it doesn't contain a number, leave the high score at 0
+        pass
 
 # Set the initial game state
 state = State.MENU
@@ -1,5 +1,5 @@
 from random import choice, randint, random, shuffle
-from enum import Enum
+from itertools import chain, islice
 import pygame, pgzero, pgzrun, sys
 
 # Check Python version number. sys.version_info gives version as a tuple, e.g. if (3,7,2,'final',0) for version 3.7.2.
@@ -63,61 +63,86 @@ LEVELS = [ ["XXXXX     XXXXXXXX     XXXXX",
 
 def block(x,y):
     # Is there a level grid block at these coordinates?
+    # This is called very often - for every pixel of movement of every object - so rather than looking at the level
+    # data itself, we look up the answer in game.block_mask, which is set up at the start of each level (see
+    # Game.next_level). Python lets us combine two comparisons such as 0 <= grid_x and grid_x < NUM_COLUMNS into one.
     grid_x = (x - LEVEL_X_OFFSET) // GRID_BLOCK_SIZE
     grid_y = y // GRID_BLOCK_SIZE
-    if grid_y > 0 and grid_y < NUM_ROWS:
-        row = game.grid[grid_y]
-        return grid_x >= 0 and grid_x < NUM_COLUMNS and len(row) > 0 and row[grid_x] != " "
+    if 0 < grid_y < NUM_ROWS and 0 <= grid_x < NUM_COLUMNS:
+        return game.block_mask[grid_y * NUM_COLUMNS + grid_x] == 1
     else:
         return False
 
-def sign(x):
-    # Returns -1 or 1 depending on whether number is positive or negative
-    return -1 if x < 0 else 1
-
 class CollideActor(Actor):
     def __init__(self, pos, anchor=ANCHOR_CENTRE):
         super().__init__("blank", pos, anchor)
 
-    def move(self, dx, dy, speed):
-        new_x, new_y = int(self.x), int(self.y)
-
-        # Movement is done 1 pixel at a time, which ensures we don't get embedded into a wall we're moving towards
-        for i in range(speed):
-            new_x, new_y = new_x + dx, new_y + dy
-
-            if new_x < 70 or new_x > 730:
-                # Collided with edge of level
-                return True
-
-            # Normally you don't need brackets surrounding the condition for an if statement (unlike many other
-            # languages), but in the case where the condition is split into multiple lines, using brackets removes
-            # the need to use the \ symbol at the end of each line.
-            # The code below checks to see if we're position we're trying to move into overlaps with a block. We only
-            # need to check the direction we're actually moving in. So first, we check to see if we're moving down
-            # (dy > 0). If that's the case, we then check to see if the proposed new y coordinate is a multiple of
-            # GRID_BLOCK_SIZE. If it is, that means we're directly on top of a place where a block might be. If that's
-            # also true, we then check to see if there is actually a block at the given position. If there's a block
-            # there, we return True and don't update the object to the new position.
-            # For movement to the right, it's the same except we check to ensure that the new x coordinate is a multiple
-            # of GRID_BLOCK_SIZE. For moving left, we check to see if the new x coordinate is the last (right-most)
-            # pixel of a grid block.
-            # Note that we don't check for collisions when the player is moving up.
-            if ((dy > 0 and new_y % GRID_BLOCK_SIZE == 0 or
-                 dx > 0 and new_x % GRID_BLOCK_SIZE == 0 or
-                 dx < 0 and new_x % GRID_BLOCK_SIZE == GRID_BLOCK_SIZE-1)
-                and block(new_x, new_y)):
-                    return True
-
-            # We only update the object's position if there wasn't a block there.
-            self.pos = new_x, new_y
-
-        # Didn't collide with block or edge of level
-        return False
+    # The extra parameters with default values are never passed in by callers. They give the method its own local
+    # names for some global functions and constants. Python looks up local names faster than global ones, which makes
+    # a difference here, as move is called for almost every object, every frame. We do the same in several of the
+    # update methods below.
+    def move(self, dx, dy, speed, block=block, GRID_BLOCK_SIZE=GRID_BLOCK_SIZE):
+        # Move up to 'speed' pixels in the given direction. Returns True if we collided with a block or the edge of the
+        # level, in which case we stop at the last position we could reach without colliding.
+        # Movement is done as if it were 1 pixel at a time, which ensures we don't get embedded into a wall we're
+        # moving towards. But rather than actually stepping through every pixel, we work out which pixels along the
+        # way could possibly cause a collision, and only check those.
+        # dx and dy are -1, 0 or 1, and only one of them is non-zero.
+        start_x, start_y = int(self.x), int(self.y)
+
+        # Edge of level - work out how many pixels we can move before we'd go past X coordinate 70 or 730.
+        # If we're already outside that range (e.g. a bolt fired by a robot standing next to the wall), our very
+        # first step will take us outside it, so we can't move at all.
+        if dx > 0:
+            max_steps = 730 - start_x if 69 <= start_x < 730 else 0
+        elif dx < 0:
+            max_steps = start_x - 70 if 70 < start_x <= 731 else 0
+        else:
+            max_steps = speed if 70 <= start_x <= 730 else 0
+
+        # If we'd reach the edge before we've moved 'speed' pixels, we collide with it
+        collided = max_steps < speed
+        steps = speed if max_steps > speed else max_steps
+
+        # Blocks - we only need to check the direction we're actually moving in. When moving down (dy > 0), we could
+        # only land on a block when the new y coordinate is a multiple of GRID_BLOCK_SIZE - that's where the top of a
+        # block might be. For movement to the right, we check X coordinates which are multiples of GRID_BLOCK_SIZE,
+        # and for moving left, we check X coordinates which are the last (right-most) pixel of a grid block. These
+        # positions are GRID_BLOCK_SIZE pixels apart, so we work out how many pixels away the first one is (which
+        # will be between 1 and GRID_BLOCK_SIZE), then go from there in steps of GRID_BLOCK_SIZE.
+        # Note that we don't check for collisions when the player is moving up.
+        if dy > 0:
+            step = GRID_BLOCK_SIZE - start_y % GRID_BLOCK_SIZE
+        elif dx > 0:
+            step = GRID_BLOCK_SIZE - start_x % GRID_BLOCK_SIZE
+        elif dx < 0:
+            step = (start_x + 1) % GRID_BLOCK_SIZE or GRID_BLOCK_SIZE
+        else:
+            step = steps + 1
+
+        while step <= steps:
+            if block(start_x + dx * step, start_y + dy * step):
+                # There's a block there, so we stop one pixel before it
+                steps = step - 1
+                collided = True
+                break
+            step += GRID_BLOCK_SIZE
+
+        # We only update the object's position if we were able to move at least one pixel
+        if steps > 0:
+            self.pos = start_x + dx * steps, start_y + dy * steps
+
+        return collided
 
 class Orb(CollideActor):
     MAX_TIMER = 250
 
+    # Names of the sprites for the orb growing and floating (orb0 to orb6), and for orbs with each type of enemy
+    # trapped inside them (e.g. TRAP_IMAGES[1][5] is "trap15"). Sprites are chosen every frame, so rather than joining
+    # strings together to make these names each time, we build them all once here and just look up the one we need
+    IMAGES = tuple("orb" + str(frame) for frame in range(7))
+    TRAP_IMAGES = tuple(tuple("trap" + str(type) + str(frame) for frame in range(8)) for type in range(2))
+
     def __init__(self, pos, dir_x):
         super().__init__(pos)
 
@@ -135,7 +160,7 @@ class Orb(CollideActor):
             self.timer = Orb.MAX_TIMER - 1
         return collided
 
-    def update(self):
+    def update(self, randint=randint):
         self.timer += 1
 
         if self.floating:
@@ -160,16 +185,19 @@ class Orb(CollideActor):
 
         if self.timer < 9:
             # Orb grows to full size over the course of 9 frames - the animation frame updating every 3 frames
-            self.image = "orb" + str(self.timer // 3)
+            self.image = Orb.IMAGES[self.timer // 3]
         else:
             if self.trapped_enemy_type != None:
-                self.image = "trap" + str(self.trapped_enemy_type) + str((self.timer // 4) % 8)
+                self.image = Orb.TRAP_IMAGES[self.trapped_enemy_type][(self.timer // 4) % 8]
             else:
-                self.image = "orb" + str(3 + (((self.timer - 9) // 8) % 4))
+                self.image = Orb.IMAGES[3 + (((self.timer - 9) // 8) % 4)]
 
 class Bolt(CollideActor):
     SPEED = 7
 
+    # Sprite names for each direction (0 for left, 1 for right) and animation frame, e.g. IMAGES[1][0] is "bolt10"
+    IMAGES = tuple(tuple("bolt" + str(direction) + str(frame) for frame in range(2)) for direction in range(2))
+
     def __init__(self, pos, dir_x):
         super().__init__(pos)
 
@@ -183,16 +211,25 @@ class Bolt(CollideActor):
             self.active = False
         else:
             # We didn't collide with a block - check to see if we collided with an orb or the player
-            for obj in game.orbs + [game.player]:
-                if obj and obj.hit_test(self):
+            # We could go through game.orbs + [game.player], but that would create a new list for every bolt, every
+            # frame. Instead we check the orbs first, and then the player. The else clause of a for loop runs if the
+            # loop finished without reaching a break statement - in this case, if we didn't hit any of the orbs.
+            for orb in game.orbs:
+                if orb.hit_test(self):
                     self.active = False
                     break
+            else:
+                if game.player and game.player.hit_test(self):
+                    self.active = False
 
-        direction_idx = "1" if self.direction_x > 0 else "0"
-        anim_frame = str((game.timer // 4) % 2)
-        self.image = "bolt" + direction_idx + anim_frame
+        direction_idx = 1 if self.direction_x > 0 else 0
+        anim_frame = game.anim_4_2
+        self.image = Bolt.IMAGES[direction_idx][anim_frame]
 
 class Pop(Actor):
+    # Sprite names for each type of pop animation (0 for fruit, 1 for orbs) and animation frame
+    IMAGES = tuple(tuple("pop" + str(type) + str(frame) for frame in range(7)) for type in range(2))
+
     def __init__(self, pos, type):
         super().__init__("blank", pos)
 
@@ -201,7 +238,7 @@ class Pop(Actor):
 
     def update(self):
         self.timer += 1
-        self.image = "pop" + str(self.type) + str(self.timer // 2)
+        self.image = Pop.IMAGES[self.type][self.timer // 2]
 
 class GravityActor(CollideActor):
     MAX_FALL_SPEED = 10
@@ -212,7 +249,7 @@ class GravityActor(CollideActor):
         self.vel_y = 0
         self.landed = False
 
-    def update(self, detect=True):
+    def update(self, detect=True, min=min, abs=abs):
         # Apply gravity, without going over the maximum fall speed
         self.vel_y = min(self.vel_y + 1, GravityActor.MAX_FALL_SPEED)
 
@@ -221,8 +258,8 @@ class GravityActor(CollideActor):
         # in the process of losing a life, however, we want them to just fall out of the level, so False is passed
         # in this case.
         if detect:
-            # Move vertically in the appropriate direction, at the appropriate speed
-            if self.move(0, sign(self.vel_y), abs(self.vel_y)):
+            # Move vertically in the appropriate direction (-1 for up or 1 for down), at the appropriate speed
+            if self.move(0, -1 if self.vel_y < 0 else 1, abs(self.vel_y)):
                 # If move returned True, we must have landed on a block.
                 # Note that move doesn't apply any collision detection when the player is moving up - only down
                 self.vel_y = 0
@@ -243,21 +280,31 @@ class Fruit(GravityActor):
     EXTRA_HEALTH = 3
     EXTRA_LIFE = 4
 
+    # The types of fruit which can be created when an orb containing a normal enemy pops (or at random during the level)
+    NORMAL_TYPES = (APPLE, RASPBERRY, LEMON)
+
+    # The types of fruit which can be created when an orb containing the more dangerous type of enemy pops. We create
+    # a tuple containing the possible types of fruit, in proportions based on the probability we want each type of
+    # fruit to be chosen. We only need to do this once, rather than every time a fruit is created.
+    AGGRESSIVE_TYPES = (10 * (APPLE, RASPBERRY, LEMON)      # Each of these appear in the tuple 10 times
+                        + 9 * (EXTRA_HEALTH,)               # This appears 9 times
+                        + (EXTRA_LIFE,))                    # This only appears once
+
+    # Sprite names for each type of fruit and animation frame. The animation goes through the sprites for frames 0, 1,
+    # 2 and then 1 again, e.g. IMAGES[3] is ("fruit30", "fruit31", "fruit32", "fruit31")
+    IMAGES = tuple(tuple("fruit" + str(type) + str(frame) for frame in (0, 1, 2, 1)) for type in range(5))
+
     def __init__(self, pos, trapped_enemy_type=0):
         super().__init__(pos)
 
         # Choose which type of fruit we're going to be.
         if trapped_enemy_type == Robot.TYPE_NORMAL:
-            self.type = choice([Fruit.APPLE, Fruit.RASPBERRY, Fruit.LEMON])
+            self.type = choice(Fruit.NORMAL_TYPES)
         else:
             # If trapped_enemy_type is 1, it means this fruit came from bursting an orb containing the more dangerous type
-            # of enemy. In this case there is a chance of getting an extra help or extra life power up
-            # We create a list containing the possible types of fruit, in proportions based on the probability we want
-            # each type of fruit to be chosen
-            types = 10 * [Fruit.APPLE, Fruit.RASPBERRY, Fruit.LEMON]    # Each of these appear in the list 10 times
-            types += 9 * [Fruit.EXTRA_HEALTH]                           # This appears 9 times
-            types += [Fruit.EXTRA_LIFE]                                 # This only appears once
-            self.type = choice(types)                                   # Randomly choose one from the list
+            # of enemy. In this case there is a chance of getting an extra help or extra life power up - see
+            # AGGRESSIVE_TYPES above
+            self.type = choice(Fruit.AGGRESSIVE_TYPES)                  # Randomly choose one from the tuple
 
         self.time_to_live = 500 # Counts down to zero
 
@@ -284,8 +331,16 @@ class Fruit(GravityActor):
             # Create 'pop' animation
             game.pops.append(Pop((self.x, self.y - 27), 0))
 
-        anim_frame = str([0, 1, 2, 1][(game.timer // 6) % 4])
-        self.image = "fruit" + str(self.type) + anim_frame
+        anim_frame = game.anim_6_4
+        self.image = Fruit.IMAGES[self.type][anim_frame]
+
+# Names of the player sprites. The sprite is chosen every frame, so rather than joining strings together to make names
+# such as "run12" each time, we build all the names once here and just look up the one we need. Where a sprite depends
+# on the direction the player is facing, index 0 is for facing left and 1 is for facing right.
+RECOIL_IMAGES = ("recoil0", "recoil1")
+BLOW_IMAGES = ("blow0", "blow1")
+FALL_IMAGES = ("fall0", "fall1")
+RUN_IMAGES = tuple(tuple("run" + str(direction) + str(frame) for frame in range(4)) for direction in range(2))
 
 class Player(GravityActor):
     def __init__(self):
@@ -397,23 +452,29 @@ class Player(GravityActor):
         # Set sprite image. If we're currently hurt, the sprite will flash on and off on alternate frames.
         self.image = "blank"
         if self.hurt_timer <= 0 or self.hurt_timer % 2 == 1:
-            dir_index = "1" if self.direction_x > 0 else "0"
+            dir_index = 1 if self.direction_x > 0 else 0
             if self.hurt_timer > 100:
                 if self.health > 0:
-                    self.image = "recoil" + dir_index
+                    self.image = RECOIL_IMAGES[dir_index]
                 else:
-                    self.image = "fall" + str((game.timer // 4) % 2)
+                    self.image = FALL_IMAGES[game.anim_4_2]
             elif self.fire_timer > 0:
-                self.image = "blow" + dir_index
+                self.image = BLOW_IMAGES[dir_index]
             elif dx == 0:
                 self.image = "still"
             else:
-                self.image = "run" + dir_index + str((game.timer // 8) % 4)
+                self.image = RUN_IMAGES[dir_index][game.anim_8_4]
 
 class Robot(GravityActor):
     TYPE_NORMAL = 0
     TYPE_AGGRESSIVE = 1
 
+    # Sprite names for each type of robot, direction (0 for left, 1 for right) and animation frame, e.g.
+    # IMAGES[1][0][6] is "robot106"
+    IMAGES = tuple(tuple(tuple("robot" + str(type) + str(direction) + str(frame) for frame in range(8))
+                         for direction in range(2))
+                   for type in range(2))
+
     def __init__(self, pos, type):
         super().__init__(pos)
 
@@ -426,7 +487,7 @@ class Robot(GravityActor):
         self.change_dir_timer = 0
         self.fire_timer = 100
 
-    def update(self):
+    def update(self, abs=abs, choice=choice, randint=randint, random=random):
         super().update()
 
         self.change_dir_timer -= 1
@@ -441,17 +502,22 @@ class Robot(GravityActor):
             # If there's a player, there's a two thirds chance that we'll move towards them
             directions = [-1, 1]
             if game.player:
-                directions.append(sign(game.player.x - self.x))
+                directions.append(-1 if game.player.x < self.x else 1)
             self.direction_x = choice(directions)
             self.change_dir_timer = randint(100, 250)
 
+        # We've finished moving, so our position won't change for the rest of this method. Below, we need to compare
+        # our edges against the positions of orbs and the player several times, so we get them once here. Each time
+        # we ask an Actor for something like self.top, Pygame Zero has to work it out from its own internal Rect object.
+        left, top, right, bottom = self.left, self.top, self.right, self.bottom
+
         # The more powerful type of robot can deliberately shoot at orbs - turning to face them if necessary
         if self.type == Robot.TYPE_AGGRESSIVE and self.fire_timer >= 24:
             # Go through all orbs to see if any can be shot at
             for orb in game.orbs:
                 # The orb must be at our height, and within 200 pixels on the x axis
-                if orb.y >= self.top and orb.y < self.bottom and abs(orb.x - self.x) < 200:
-                    self.direction_x = sign(orb.x - self.x)
+                if orb.y >= top and orb.y < bottom and abs(orb.x - self.x) < 200:
+                    self.direction_x = -1 if orb.x < self.x else 1
                     self.fire_timer = 0
                     break
 
@@ -459,7 +525,7 @@ class Robot(GravityActor):
         if self.fire_timer >= 12:
             # Random chance of firing each frame. Likelihood increases 10 times if player is at the same height as us
             fire_probability = game.fire_probability()
-            if game.player and self.top < game.player.bottom and self.bottom > game.player.top:
+            if game.player and top < game.player.bottom and bottom > game.player.top:
                 fire_probability *= 10
             if random() < fire_probability:
                 self.fire_timer = 0
@@ -470,8 +536,14 @@ class Robot(GravityActor):
             game.bolts.append(Bolt((self.x + self.direction_x * 20, self.y - 38), self.direction_x))
 
         # Am I colliding with an orb? If so, become trapped by it
+        # Rather than calling self.collidepoint for every orb, we check whether the centre of the orb is inside our
+        # rectangle using the edges we got above. As with collidepoint, a point on our left or top edge counts as
+        # being inside, but a point on our right or bottom edge doesn't.
         for orb in game.orbs:
-            if orb.trapped_enemy_type == None and self.collidepoint(orb.center):
+            if orb.trapped_enemy_type != None:
+                continue
+            orb_x, orb_y = orb.center
+            if left <= orb_x < right and top <= orb_y < bottom:
                 self.alive = False
                 orb.floating = True
                 orb.trapped_enemy_type = self.type
@@ -479,17 +551,25 @@ class Robot(GravityActor):
                 break
 
         # Choose and set sprite image
-        direction_idx = "1" if self.direction_x > 0 else "0"
-        image = "robot" + str(self.type) + direction_idx
+        direction_idx = 1 if self.direction_x > 0 else 0
+        images = Robot.IMAGES[self.type][direction_idx]
         if self.fire_timer < 12:
-            image += str(5 + (self.fire_timer // 4))
+            self.image = images[5 + (self.fire_timer // 4)]
         else:
-            image += str(1 + ((game.timer // 4) % 4))
-        self.image = image
+            self.image = images[1 + game.anim_4_4]
 
 
+# Dictionary of sound effects which have been played so far - see Game.get_sounds
+sound_cache = {}
+
 class Game:
     def __init__(self, player=None):
+        self.reset(player)
+
+    def reset(self, player=None):
+        # Start a new game, going back to the first level. This is called when the Game object is created, and also
+        # when we switch between the menu and play states - rather than throwing the old Game object away and
+        # creating a new one, we just put the existing one back to how it was at the start.
         self.player = player
         self.level_colour = -1
         self.level = -1
@@ -520,6 +600,24 @@ class Game:
         # 'self.grid = list(LEVELS...', then used append or += on the line below.
         self.grid = self.grid + [self.grid[0]]
 
+        # Some rows of the level data are empty strings, so before we can check for a block at a certain grid position
+        # we'd need to check whether the row is long enough. To make the block function above as simple as possible,
+        # we create a bytearray - a list of numbers between 0 and 255 - with one entry for each position in the grid,
+        # which is 1 if there's a block there and 0 if not. The entries go from left to right along the top row, then
+        # along the second row, and so on, so the entry for a given grid position is at
+        # grid_y * NUM_COLUMNS + grid_x. A new bytearray starts with all entries being zero.
+        # The level doesn't change until we move on to the next one, so while we're at it, we also make a list of the
+        # screen positions of all the blocks, so that Game.draw doesn't have to go through the level data each frame.
+        # The first column is LEVEL_X_OFFSET pixels from the left of the screen, as the large blocks at the edge of the
+        # level are 50 pixels wide
+        self.block_mask = bytearray(NUM_ROWS * NUM_COLUMNS)
+        self.block_positions = []
+        for grid_y in range(NUM_ROWS):
+            for grid_x, char in enumerate(self.grid[grid_y]):
+                if char != " ":
+                    self.block_mask[grid_y * NUM_COLUMNS + grid_x] = 1
+                    self.block_positions.append((LEVEL_X_OFFSET + grid_x * GRID_BLOCK_SIZE, grid_y * GRID_BLOCK_SIZE))
+
         self.timer = -1
 
         if self.player:
@@ -570,21 +668,75 @@ class Game:
     def update(self):
         self.timer += 1
 
-        # Update all objects
-        for obj in self.fruits + self.bolts + self.enemies + self.pops + [self.player] + self.orbs:
-            if obj:
-                obj.update()
+        # Several types of object have animations which are based on the game timer, rather than on a timer of their
+        # own. So that each object doesn't have to work out its current animation frame separately, we do it once
+        # here. anim_4_2 is the current frame of a two-frame animation which moves on to its next frame every 4 game
+        # frames, and so on.
+        self.anim_4_2 = (self.timer // 4) % 2       # Bolts and the player falling out of the level
+        self.anim_4_4 = (self.timer // 4) % 4       # Robots walking
+        self.anim_6_4 = (self.timer // 6) % 4       # Fruit
+        self.anim_8_4 = (self.timer // 8) % 4       # The player running
+
+        # Update all objects, and remove objects which are no longer wanted from the lists. For example, we recreate
+        # self.fruits such that it contains all existing fruits except those whose time_to_live counter has reached
+        # zero. Rather than updating everything and then going through all the lists a second time to remove objects,
+        # we decide whether to keep each object straight after updating it, and add the ones we're keeping to a new
+        # list. Whether an object is wanted only changes when that object is updated, so the result is the same.
+        # Some objects create new objects when they're updated - e.g. a fruit creates a Pop object when it disappears,
+        # and the player creates orbs. We don't want to update those new objects until the next frame. Fruits, bolts and
+        # robots are only ever created by objects which are updated after them, so by the time that happens, the
+        # new list is already in place and the new object is added to it. But new pops and orbs can be added to those
+        # lists before we've got round to updating them, so we make a note of how many there are to begin with, and
+        # use islice to stop going through each list once we've reached that number.
+        num_pops = len(self.pops)
+        num_orbs = len(self.orbs)
+
+        fruits = []
+        for fruit in self.fruits:
+            fruit.update()
+            if fruit.time_to_live > 0:
+                fruits.append(fruit)
+        self.fruits = fruits
+
+        bolts = []
+        for bolt in self.bolts:
+            bolt.update()
+            if bolt.active:
+                bolts.append(bolt)
+        self.bolts = bolts
+
+        enemies = []
+        for enemy in self.enemies:
+            enemy.update()
+            if enemy.alive:
+                enemies.append(enemy)
+        self.enemies = enemies
+
+        pops = []
+        for pop in islice(self.pops, num_pops):
+            pop.update()
+            if pop.timer < 12:
+                pops.append(pop)
+        # Any pops which were created this frame go on the end, as they would have done if they'd been added to the
+        # new list in the first place
+        pops += self.pops[num_pops:]
+        self.pops = pops
 
-        # Use list comprehensions to remove objects which are no longer wanted from the lists. For example, we recreate
-        # self.fruits such that it contains all existing fruits except those whose time_to_live counter has reached zero
-        self.fruits = [f for f in self.fruits if f.time_to_live > 0]
-        self.bolts = [b for b in self.bolts if b.active]
-        self.enemies = [e for e in self.enemies if e.alive]
-        self.pops = [p for p in self.pops if p.timer < 12]
-        self.orbs = [o for o in self.orbs if o.timer < 250 and o.y > -40]
+        if self.player:
+            self.player.update()
+
+        orbs = []
+        for orb in islice(self.orbs, num_orbs):
+            orb.update()
+            if orb.timer < 250 and orb.y > -40:
+                orbs.append(orb)
+        # New orbs haven't been updated yet, but one could still have been created above the top of the screen (if
+        # the player is up there), in which case it's removed straight away
+        orbs += [orb for orb in self.orbs[num_orbs:] if orb.y > -40]
+        self.orbs = orbs
 
         # Every 100 frames, create a random fruit (unless there are no remaining enemies on this level)
-        if self.timer % 100 == 0 and len(self.pending_enemies + self.enemies) > 0:
+        if self.timer % 100 == 0 and (self.pending_enemies or self.enemies):
             # Create fruit at random position
             self.fruits.append(Fruit((randint(70, 730), randint(75, 400))))
 
@@ -599,8 +751,12 @@ class Game:
         # End level if there are no enemies remaining to be created, no existing enemies, no fruit, no popping orbs,
         # and no orbs containing trapped enemies. (We don't want to include orbs which don't contain trapped enemies,
         # as the level would never end if the player kept firing new orbs)
-        if len(self.pending_enemies + self.fruits + self.enemies + self.pops) == 0:
-            if len([orb for orb in self.orbs if orb.trapped_enemy_type != None]) == 0:
+        # An empty list counts as False in an if statement, so 'not self.fruits' is True if there are no fruits. This
+        # lets us check each list in turn, rather than adding them all together into a new list just to see how long
+        # it is. Python stops checking as soon as it finds a list that isn't empty. The any function works in a similar
+        # way, stopping as soon as it finds an orb which contains an enemy.
+        if not self.pending_enemies and not self.fruits and not self.enemies and not self.pops:
+            if not any(orb.trapped_enemy_type != None for orb in self.orbs):
                 self.next_level()
 
     def draw(self):
@@ -609,21 +765,15 @@ class Game:
 
         block_sprite = "block" + str(self.level % 4)
 
-        # Display blocks
-        for row_y in range(NUM_ROWS):
-            row = self.grid[row_y]
-            if len(row) > 0:
-                # Initial offset - large blocks at edge of level are 50 pixels wide
-                x = LEVEL_X_OFFSET
-                for block in row:
-                    if block != ' ':
-                        screen.blit(block_sprite, (x, row_y * GRID_BLOCK_SIZE))
-                    x += GRID_BLOCK_SIZE
-
-        # Draw all objects
-        all_objs = self.fruits + self.bolts + self.enemies + self.pops + self.orbs
-        all_objs.append(self.player)
-        for obj in all_objs:
+        # Display blocks, using the list of block positions worked out at the start of the level (see next_level)
+        # There are lots of blocks, so we store screen.blit in a local variable, rather than having Python look up
+        # screen and then its blit method for every block
+        blit = screen.blit
+        for pos in self.block_positions:
+            blit(block_sprite, pos)
+
+        # Draw all objects - see update for an explanation of chain
+        for obj in chain(self.fruits, self.bolts, self.enemies, self.pops, self.orbs, (self.player,)):
             if obj:
                 obj.draw()
 
@@ -638,30 +788,58 @@ class Game:
                 # But what if you have files named 'explosion0.ogg' to 'explosion5.ogg' and want to randomly choose
                 # one of them to play? You can generate a string such as 'explosion3', but to use such a string
                 # to access an attribute of Pygame Zero's sounds object, we must use Python's built-in function getattr
-                sound = getattr(sounds, name + str(randint(0, count - 1)))
+                # We only need to do that the first time each sound is played - see get_sounds below
+                sound = self.get_sounds(name, count)[randint(0, count - 1)]
                 sound.play()
             except Exception as e:
                 # If no such sound file exists, print the name
                 print(e)
 
+    def get_sounds(self, name, count):
+        # Returns a list of all the varieties of the given sound, e.g. for "laser" with a count of 4, the list contains
+        # sounds.laser0 to sounds.laser3. Building the names and looking each one up with getattr isn't something we
+        # want to do every time a sound is played, so the first time we're asked for a sound, we store the list in
+        # the sound_cache dictionary, and from then on we can just look it up there.
+        sound_list = sound_cache.get(name)
+        if sound_list is None:
+            sound_list = [getattr(sounds, name + str(i)) for i in range(count)]
+            sound_cache[name] = sound_list
+        return sound_list
+
 # Widths of the letters A to Z in the font images
 CHAR_WIDTH = [27, 26, 25, 26, 25, 25, 26, 25, 12, 26, 26, 25, 33, 25, 26,
               25, 27, 26, 26, 25, 26, 26, 38, 25, 25, 25]
 
+# Widths of characters, indexed by their ASCII/Unicode code (which we get using the ord function), up to and including
+# the code for Z. For characters other than the letters A to Z (i.e. space, and the digits 0 to 9), the width of the
+# letter A is used. Looking up the width in this list means we don't need to work out which entry of CHAR_WIDTH to use
+# every time we draw a character.
+CHAR_WIDTH_BY_CODE = [CHAR_WIDTH[max(0, code - 65)] for code in range(65 + len(CHAR_WIDTH))]
+
 def char_width(char):
-    # Return width of given character. For characters other than the letters A to Z (i.e. space, and the digits 0 to 9),
-    # the width of the letter A is returned. ord gives the ASCII/Unicode code for the given character.
-    index = max(0, ord(char) - 65)
-    return CHAR_WIDTH[index]
+    # Return width of given character
+    return CHAR_WIDTH_BY_CODE[ord(char)]
+
+# Total widths of strings which have been drawn centred on the screen - see draw_text
+text_widths = {}
 
 def draw_text(text, y, x=None):
     if x == None:
-        # If no X pos specified, draw text in centre of the screen - must first work out total width of text
-        x = (WIDTH - sum([char_width(c) for c in text])) // 2
-
+        # If no X pos specified, draw text in centre of the screen - must first work out total width of text.
+        # The same text tends to be drawn every frame (e.g. "LEVEL 1"), so we only add up the character widths the
+        # first time we see a piece of text, and store the result in the text_widths dictionary
+        width = text_widths.get(text)
+        if width is None:
+            width = sum([char_width(c) for c in text])
+            text_widths[text] = width
+        x = (WIDTH - width) // 2
+
+    # As in Game.draw, we store screen.blit in a local variable as we use it for every character
+    blit = screen.blit
     for char in text:
-        screen.blit("font0"+str(ord(char)), (x, y))
-        x += char_width(char)
+        code = ord(char)
+        blit("font0"+str(code), (x, y))
+        x += CHAR_WIDTH_BY_CODE[code]
 
 IMAGE_WIDTH = {"life":44, "plus":40, "health":40}
 
@@ -693,90 +871,120 @@ space_down = False
 # Has the space bar just been pressed? i.e. gone from not being pressed, to being pressed
 def space_pressed():
     global space_down
-    if keyboard.space:
-        if space_down:
-            # Space was down previous frame, and is still down
-            return False
-        else:
-            # Space wasn't down previous frame, but now is
-            space_down = True
-            return True
-    else:
-        space_down = False
-        return False
+    space = keyboard.space
+
+    # Space has just been pressed if it's down now, but wasn't down on the previous frame
+    pressed = space and not space_down
+
+    # Remember whether space is down for next time
+    space_down = space
+    return pressed
 
 # Pygame Zero calls the update and draw functions each frame
 
-class State(Enum):
+# The game states. These are plain whole numbers rather than an Enum, because Python can compare numbers and look
+# them up in a dictionary (see UPDATE_FUNCTIONS below) more quickly than Enum values, and we do that every frame
+class State:
     MENU = 1
     PLAY = 2
     GAME_OVER = 3
 
+# The current state, and the Player object for the game in progress (which is set when we switch to the play
+# state), are kept as attributes of this class rather than as global variables. That way the functions below can
+# change them without needing 'global' statements. We never create an instance of Ctx - it's just used as a
+# container for the two values.
+class Ctx:
+    state = State.MENU
+    current_player = None
+
+
+# Each state has its own update and draw functions
+
+def update_menu():
+    if space_pressed():
+        # Switch to play state, and start a new game, passing it a new Player object to use. We also keep a reference
+        # to the player in Ctx.current_player, so that update_play can check the number of lives without going via game
+        Ctx.state = State.PLAY
+        Ctx.current_player = Player()
+        game.reset(Ctx.current_player)
+
+    # Update the game. If we've just switched to the play state, this updates the new game straight away, rather than
+    # waiting until the next frame, so that the game responds to the space bar being pressed one frame sooner
+    game.update()
+
+def update_play():
+    if Ctx.current_player.lives < 0:
+        game.play_sound("over")
+        Ctx.state = State.GAME_OVER
+    else:
+        game.update()
+
+def update_game_over():
+    if space_pressed():
+        # Switch to menu state, and start a new game without a player
+        Ctx.state = State.MENU
+        game.reset()
+
+# The "Press SPACE" animation has 10 frames numbered 0 to 9, and repeats every 160 game frames. This list gives the
+# image to show for each of those 160 frames, so that draw_menu can just look it up using the game timer.
+# The first part gives us a number between 0 and 159, based on the game timer
+# Dividing by 4 means we go to a new animation frame every 4 frames
+# We enclose this calculation in the min function, with the other argument being 9, which results in the
+# animation staying on frame 9 for three quarters of the time. Adding 40 to the game timer is done to alter
+# which stage the animation is at when the game first starts
+# Rather than storing the image names, we store the images themselves. Pygame Zero's images object loads each image
+# the first time we ask for it, so the 160 entries only refer to 10 different images. Passing an image to screen.blit
+# instead of a name means it doesn't have to look the name up every frame. We do the same for the title and game
+# over images.
+SPACE_IMAGES = [getattr(images, "space" + str(min(((timer + 40) % 160) // 4, 9))) for timer in range(160)]
+TITLE_IMAGE = images.title
+OVER_IMAGE = images.over
+
+def draw_menu():
+    # Draw title screen
+    screen.blit(TITLE_IMAGE, (0, 0))
+
+    # Draw "Press SPACE" animation - see SPACE_IMAGES below
+    screen.blit(SPACE_IMAGES[game.timer % 160], (130, 280))
+
+def draw_play():
+    draw_status()
+
+def draw_game_over():
+    draw_status()
+    # Display "Game Over" image
+    screen.blit(OVER_IMAGE, (0, 0))
+
+# Rather than using a series of if/elif statements to check which state we're in every frame, we look up the
+# functions to call in these dictionaries, using the current state as the key. Python lets us store functions in
+# variables, lists and dictionaries just like any other value - note that there are no brackets after the function
+# names, as we're not calling the functions here.
+UPDATE_FUNCTIONS = {State.MENU: update_menu, State.PLAY: update_play, State.GAME_OVER: update_game_over}
+DRAW_FUNCTIONS = {State.MENU: draw_menu, State.PLAY: draw_play, State.GAME_OVER: draw_game_over}
 
 def update():
-    global state, game
-
-    if state == State.MENU:
-        if space_pressed():
-            # Switch to play state, and create a new Game object, passing it a new Player object to use
-            state = State.PLAY
-            game = Game(Player())
-        else:
-            game.update()
-
-    elif state == State.PLAY:
-        if game.player.lives < 0:
-            game.play_sound("over")
-            state = State.GAME_OVER
-        else:
-            game.update()
-
-    elif state == State.GAME_OVER:
-        if space_pressed():
-            # Switch to menu state, and create a new game object without a player
-            state = State.MENU
-            game = Game()
+    UPDATE_FUNCTIONS[Ctx.state]()
 
 def draw():
     game.draw()
-
-    if state == State.MENU:
-        # Draw title screen
-        screen.blit("title", (0, 0))
-
-        # Draw "Press SPACE" animation, which has 10 frames numbered 0 to 9
-        # The first part gives us a number between 0 and 159, based on the game timer
-        # Dividing by 4 means we go to a new animation frame every 4 frames
-        # We enclose this calculation in the min function, with the other argument being 9, which results in the
-        # animation staying on frame 9 for three quarters of the time. Adding 40 to the game timer is done to alter
-        # which stage the animation is at when the game first starts
-        anim_frame = min(((game.timer + 40) % 160) // 4, 9)
-        screen.blit("space" + str(anim_frame), (130, 280))
-
-    elif state == State.PLAY:
-        draw_status()
-
-    elif state == State.GAME_OVER:
-        draw_status()
-        # Display "Game Over" image
-        screen.blit("over", (0, 0))
+    DRAW_FUNCTIONS[Ctx.state]()
 
 # Set up sound system and start music
 try:
     pygame.mixer.quit()
-    pygame.mixer.init(44100, -16, 2, 1024)
+    # The last argument is the buffer size in samples. A smaller buffer means sound effects start playing sooner
+    # after the event that triggers them - 512 samples is about 12 milliseconds at 44100 samples per second
+    pygame.mixer.init(44100, -16, 2, 512)
 
     music.play("theme")
     music.set_volume(0.3)
-except:
-    # If an error occurs, just ignore it
+except pygame.error:
+    # If the sound system can't be started (e.g. there's no sound device), just carry on without music. We only catch
+    # pygame.error here, so that other mistakes, such as a typo in this block, aren't silently hidden.
     pass
 
 
 
-# Set the initial game state
-state = State.MENU
-
 # Create a new Game object, without a Player object
 game = Game()
 